@@ -15,10 +15,10 @@
 
 from oslo_config import cfg
 from oslo_log import log as logging
-from oslo_serialization import jsonutils
 import webob.exc
 
 from clictest.api import policy
+from clictest.common import auth
 from clictest.common import wsgi
 import clictest.context
 from clictest.i18n import _, _LW
@@ -48,9 +48,12 @@ LOG = logging.getLogger(__name__)
 
 
 class BaseContextMiddleware(wsgi.Middleware):
-    def process_response(self, resp):
+
+    timing_stage = 'context'
+
+    def process_response_headers(self, req, headers):
         try:
-            request_id = resp.request.context.request_id
+            request_id = req.context.request_id
         except AttributeError:
             LOG.warn(_LW('Unable to retrieve request id from context'))
         else:
@@ -60,14 +63,16 @@ class BaseContextMiddleware(wsgi.Middleware):
             if not request_id.startswith(prefix):
                 request_id = prefix + request_id
 
-            resp.headers['x-openstack-request-id'] = request_id
+            headers = [(name, value) for name, value in headers
+                       if name.lower() != 'x-openstack-request-id']
+            headers.append(('x-openstack-request-id', request_id))
 
-        return resp
+        return headers
 
 
 class ContextMiddleware(BaseContextMiddleware):
     def __init__(self, app):
-        self.policy_enforcer = policy.Enforcer()
+        self.policy_enforcer = policy.get_enforcer()
         super(ContextMiddleware, self).__init__(app)
 
     def process_request(self, req):
@@ -114,7 +119,8 @@ class ContextMiddleware(BaseContextMiddleware):
         if req.headers.get('X-Service-Catalog') is not None:
             try:
                 catalog_header = req.headers.get('X-Service-Catalog')
-                service_catalog = jsonutils.loads(catalog_header)
+                service_catalog = auth.parse_service_catalog(
+                    catalog_header).catalog
             except ValueError:
                 raise webob.exc.HTTPInternalServerError(
                     _('Invalid service catalog json.'))
@@ -149,6 +155,7 @@ class UnauthenticatedContextMiddleware(BaseContextMiddleware):
             'tenant': None,
             'roles': [],
             'is_admin': True,
+            'policy_enforcer': policy.get_enforcer(),
         }
 
         req.context = clictest.context.RequestContext(**kwargs)
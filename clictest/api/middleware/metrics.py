@@ -0,0 +1,129 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+A filter middleware that times every request per route and serves the
+metrics of the worker, along with the statistics aggregated over all the
+workers, in the Prometheus text format.
+
+Since any worker may answer a scrape, the per-worker series carry a
+``worker`` label while the cross-worker totals, read from the shared
+statistics segment, do not.
+
+The filter must sit before version negotiation in the pipeline, that is
+before authentication, so it only serves the metrics to the addresses
+listed in `allowed_hosts`, or to every address if it is ``*``.
+"""
+
+from oslo_log import log as logging
+from oslo_utils import excutils
+
+from clictest.common import metrics
+from clictest.common import stats
+from clictest.common import timeutils
+from clictest.common import utils
+from clictest.common import wsgi
+
+LOG = logging.getLogger(__name__)
+
+UNMATCHED_ROUTE = 'unmatched'
+
+
+def _pool_usage():
+    running = 0
+    size = 0
+    for pool in wsgi.ASYNC_EVENTLET_THREAD_POOL_LIST:
+        running += pool.running()
+        size += pool.size
+    # NOTE: Both values come from one walk over the pools so that a scrape
+    # never reports more running green threads than the pools can hold.
+    return {('running',): running, ('size',): size}
+
+
+metrics.Gauge('clictest_greenpool_threads',
+              'Green threads running in the pools of this worker, and the '
+              'size of these pools.',
+              _pool_usage, labelnames=('measure',))
+
+
+class MetricsMiddleware(object):
+    """Raw WSGI filter; it does not build any webob object per request."""
+
+    def __init__(self, application, path='/metrics',
+                 allowed_hosts='127.0.0.1 ::1'):
+        self.application = application
+        self.path = path
+        self.allowed_hosts = utils.AllowedHosts(allowed_hosts)
+        self._routes = {}
+        metrics.install_gc_hooks()
+
+    @classmethod
+    def factory(cls, global_conf, **local_conf):
+        def filter(app):
+            return cls(app, **local_conf)
+        return filter
+
+    def _histogram(self, route, environ):
+        """Return the duration histogram of a route, created once per route.
+
+        Routes are keyed on the route object set by the routes middleware,
+        so no label string is built per request.
+        """
+        histogram = self._routes.get(route)
+        if histogram is None:
+            if route is None:
+                label = UNMATCHED_ROUTE
+            else:
+                # NOTE: The API routers are mounted under their version
+                # prefix, which urlmap moved to SCRIPT_NAME.
+                label = environ.get('SCRIPT_NAME', '') + route.routepath
+            histogram = metrics.REQUEST_DURATION.labels(label)
+            self._routes[route] = histogram
+        return histogram
+
+    def _render(self, environ, start_response):
+        remote_addr = environ.get('REMOTE_ADDR')
+        if remote_addr not in self.allowed_hosts:
+            LOG.debug("Metrics request from %s refused", remote_addr)
+            start_response('403 Forbidden', [('Content-Length', '0')])
+            return []
+
+        body = metrics.REGISTRY.render()
+        segment = stats.get_segment()
+        if segment is not None:
+            body += '\n'.join(metrics.render_worker_stats(segment) +
+                              ['']).encode('utf-8')
+        start_response('200 OK', [('Content-Type', metrics.CONTENT_TYPE),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
+
+    def __call__(self, environ, start_response):
+        if (environ.get('PATH_INFO') == self.path and
+                environ.get('REQUEST_METHOD') == 'GET'):
+            return self._render(environ, start_response)
+
+        start = timeutils.now()
+
+        def _observe():
+            self._histogram(environ.get('routes.route'), environ).observe(
+                timeutils.now() - start)
+
+        try:
+            result = self.application(environ, start_response)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                _observe()
+        # NOTE: Streamed bodies are only sent once the application returned.
+        return utils.on_response_closed(result, _observe)
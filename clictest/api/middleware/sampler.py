@@ -0,0 +1,92 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+A filter middleware exposing an admin endpoint to control the sampling
+profiler of the worker handling the request:
+
+    GET  /admin/sampler                  -- status of the sampler
+    POST /admin/sampler?action=start     -- start a session, optionally
+                                            for `duration` seconds
+    POST /admin/sampler?action=stop      -- stop and write the results
+
+The filter must sit before version negotiation in the pipeline and only
+answers requests coming from the addresses listed in `allowed_hosts`, or
+from every address if it is ``*``.
+"""
+
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+import webob
+import webob.exc
+
+from clictest.common import sampler
+from clictest.common import utils
+from clictest.common import wsgi
+from clictest.i18n import _
+
+LOG = logging.getLogger(__name__)
+
+
+class SamplerMiddleware(wsgi.Middleware):
+
+    def __init__(self, app, path='/admin/sampler',
+                 allowed_hosts='127.0.0.1 ::1'):
+        self.path = path
+        self.allowed_hosts = utils.AllowedHosts(allowed_hosts)
+        super(SamplerMiddleware, self).__init__(app)
+
+    @classmethod
+    def factory(cls, global_conf, **local_conf):
+        def filter(app):
+            return cls(app, **local_conf)
+        return filter
+
+    def process_request(self, req):
+        if req.path_info != self.path:
+            return None
+
+        if req.remote_addr not in self.allowed_hosts:
+            LOG.debug("Sampler request from %s refused", req.remote_addr)
+            return webob.exc.HTTPForbidden()
+
+        profiler = sampler.get_sampler()
+        if req.method == 'POST':
+            action = req.params.get('action')
+            if action == 'start':
+                try:
+                    duration = int(req.params.get(
+                        'duration', sampler.CONF.sampler.duration))
+                except ValueError:
+                    msg = _('duration must be an integer')
+                    return webob.exc.HTTPBadRequest(explanation=msg)
+                if duration <= 0:
+                    msg = _('duration must be positive')
+                    return webob.exc.HTTPBadRequest(explanation=msg)
+                if not profiler.start(duration):
+                    msg = _('A sampling session is already running')
+                    return webob.exc.HTTPConflict(explanation=msg)
+            elif action == 'stop':
+                profiler.stop()
+            else:
+                msg = _('action must be either start or stop')
+                return webob.exc.HTTPBadRequest(explanation=msg)
+        elif req.method != 'GET':
+            return webob.exc.HTTPMethodNotAllowed(
+                headers=[('Allow', 'GET, POST')])
+
+        return webob.Response(request=req,
+                              content_type='application/json',
+                              body=jsonutils.dump_as_bytes(profiler.status()))
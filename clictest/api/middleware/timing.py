@@ -0,0 +1,124 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+A filter middleware that, when request timing is enabled, reports the time
+spent in each stage of a request in a ``Server-Timing`` response header and
+logs the breakdown of the requests slower than a threshold.
+
+Streamed bodies are only sent once the application returned, so a request
+is logged once its response is closed, and the ``Server-Timing`` header of
+a streamed response, sent before its body, carries no total.
+"""
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import excutils
+
+from clictest.common import timing
+from clictest.common import utils
+from clictest.i18n import _, _LW
+
+timing_opts = [
+    cfg.BoolOpt('enable_request_timing', default=False,
+                help=_('Time the stages of every API request (middlewares, '
+                       'routing, deserialization, dispatch, serialization '
+                       'and upstream calls) and return the breakdown in a '
+                       'Server-Timing response header. Requires the '
+                       'requesttiming filter in the paste pipeline.')),
+    cfg.FloatOpt('slow_request_threshold', default=1.0, min=0,
+                 help=_('Requests taking longer than this number of seconds '
+                        'are logged along with their stage breakdown when '
+                        'request timing is enabled. A value of 0 disables '
+                        'the slow request log.')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(timing_opts)
+
+LOG = logging.getLogger(__name__)
+
+
+class RequestTimingMiddleware(object):
+
+    def __init__(self, application):
+        self.application = application
+
+    @classmethod
+    def factory(cls, global_conf, **local_conf):
+        def filter(app):
+            return cls(app)
+        return filter
+
+    def __call__(self, environ, start_response):
+        if not CONF.enable_request_timing:
+            return self.application(environ, start_response)
+
+        timer = timing.RequestTimer()
+        environ[timing.ENVIRON_KEY] = timer
+        # NOTE: The headers are held back until the application returned, so
+        # that the total can be reported when the body is complete already.
+        state = {'pending': None, 'write': None, 'returned': False}
+
+        def _send_headers(total):
+            status, headers, exc_info = state['pending']
+            state['pending'] = None
+            value = timer.server_timing(total)
+            if value:
+                headers.append(('Server-Timing', value))
+            state['write'] = start_response(status, headers, exc_info)
+            return state['write']
+
+        def _write(data):
+            write = state['write']
+            if write is None:
+                write = _send_headers(None)
+            write(data)
+
+        def _start_response(status, headers, exc_info=None):
+            state['pending'] = (status, headers, exc_info)
+            if state['returned'] or state['write'] is not None:
+                return _send_headers(None)
+            return _write
+
+        def _finish():
+            self._log_slow_request(environ, timer)
+
+        try:
+            result = self.application(environ, _start_response)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                _finish()
+        state['returned'] = True
+        if state['pending'] is not None:
+            if isinstance(result, (list, tuple)):
+                _send_headers(timer.elapsed())
+            else:
+                _send_headers(None)
+        return utils.on_response_closed(result, _finish)
+
+    @staticmethod
+    def _log_slow_request(environ, timer):
+        threshold = CONF.slow_request_threshold
+        total = timer.elapsed()
+        if not threshold or total < threshold:
+            return
+        LOG.warn(_LW("Slow request method=%(method)s path=%(path)s "
+                     "total=%(total).3fms %(stages)s"),
+                 {'method': environ.get('REQUEST_METHOD'),
+                  'path': (environ.get('SCRIPT_NAME', '') +
+                           environ.get('PATH_INFO', '')),
+                  'total': total * 1000,
+                  'stages': timer.breakdown()})
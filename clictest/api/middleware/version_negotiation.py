@@ -32,6 +32,8 @@ LOG = logging.getLogger(__name__)
 
 class VersionNegotiationFilter(wsgi.Middleware):
 
+    timing_stage = 'version'
+
     def __init__(self, app):
         self.versions_app = versions.Controller()
         self.allowed_versions = None
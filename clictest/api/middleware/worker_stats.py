@@ -0,0 +1,69 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+A filter middleware that serves the request statistics aggregated over all
+the API workers from the shared statistics segment.
+
+The filter must sit before version negotiation in the pipeline and only
+answers requests coming from the addresses listed in `allowed_hosts`, or
+from every address if it is ``*``.
+"""
+
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+import webob
+import webob.exc
+
+from clictest.common import stats
+from clictest.common import utils
+from clictest.common import wsgi
+
+LOG = logging.getLogger(__name__)
+
+
+class WorkerStatsMiddleware(wsgi.Middleware):
+
+    def __init__(self, app, path='/stats', allowed_hosts='127.0.0.1 ::1'):
+        self.path = path
+        self.allowed_hosts = utils.AllowedHosts(allowed_hosts)
+        super(WorkerStatsMiddleware, self).__init__(app)
+
+    @classmethod
+    def factory(cls, global_conf, **local_conf):
+        def filter(app):
+            return cls(app, **local_conf)
+        return filter
+
+    def process_request(self, req):
+        if req.path_info != self.path or req.method != 'GET':
+            return None
+
+        if req.remote_addr not in self.allowed_hosts:
+            LOG.debug("Worker statistics request from %s refused",
+                      req.remote_addr)
+            return webob.exc.HTTPForbidden()
+
+        segment = stats.get_segment()
+        if segment is None:
+            LOG.debug("Worker statistics requested but they are disabled")
+            return webob.exc.HTTPNotFound()
+
+        body = {'total': segment.aggregate()}
+        if req.params.get('detail'):
+            body['workers'] = segment.workers()
+        return webob.Response(request=req,
+                              content_type='application/json',
+                              body=jsonutils.dump_as_bytes(body))
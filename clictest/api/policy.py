@@ -22,13 +22,27 @@ from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_policy import policy
 
+from clictest.api import policy_compiler
 from clictest.common import exception
+from clictest.common import metrics
+from clictest.common import timeutils
+from clictest.common import utils
 import clictest.domain.proxy
 from clictest.i18n import _
 
 
 LOG = logging.getLogger(__name__)
+
+policy_opts = [
+    cfg.IntOpt('policy_decision_cache_size', default=1024, min=0,
+               help=_('Maximum number of policy decisions cached per '
+                      'enforcer. Only the decisions of rules depending on '
+                      'nothing but the roles of the user are cached. Set to '
+                      '0 to disable the cache.')),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(policy_opts)
 
 DEFAULT_RULES = policy.Rules.from_dict({
     'context_is_admin': 'role:admin',
@@ -36,21 +50,114 @@ DEFAULT_RULES = policy.Rules.from_dict({
     'manage_image_cache': 'role:admin',
 })
 
+# seconds between two lookups of a missing policy file
+POLICY_FILE_CHECK_INTERVAL = 10
+
+_ENFORCER = None
+
+_DECISIONS = metrics.Counter(
+    'clictest_policy_decision_cache_total',
+    'Lookups of the policy decision cache, per result.',
+    labelnames=('result',))
+_DECISION_HITS = _DECISIONS.labels('hit')
+_DECISION_MISSES = _DECISIONS.labels('miss')
+
+_MISSING = object()
+
 
 class Enforcer(policy.Enforcer):
     """Responsible for loading and enforcing rules"""
 
     def __init__(self):
+        # NOTE: The decision cache must exist before the parent constructor
+        # runs, as it may set the rules.
+        self._decisions = utils.LRUCache(CONF.policy_decision_cache_size)
+        self._rule_set = None
+        self._next_file_check = None
         if CONF.find_file(CONF.oslo_policy.policy_file):
             kwargs = dict(rules=None, use_conf=True)
         else:
             kwargs = dict(rules=DEFAULT_RULES, use_conf=False)
+            self._next_file_check = (timeutils.now() +
+                                     POLICY_FILE_CHECK_INTERVAL)
         super(Enforcer, self).__init__(CONF, overwrite=False, **kwargs)
 
+    def load_rules(self, force_reload=False):
+        """Load the rules of the policy file, if it changed.
+
+        An enforcer built while the policy file was missing uses the default
+        rules, and looks the file up again every POLICY_FILE_CHECK_INTERVAL
+        seconds until it is found.
+        """
+        if (self._next_file_check is not None and
+                timeutils.now() >= self._next_file_check):
+            if CONF.find_file(CONF.oslo_policy.policy_file):
+                # NOTE: The rules of the file replace the default ones, as
+                # if it had existed when the enforcer was built.
+                self._next_file_check = None
+                self.set_rules({}, use_conf=True)
+            else:
+                self._next_file_check = (timeutils.now() +
+                                         POLICY_FILE_CHECK_INTERVAL)
+        super(Enforcer, self).load_rules(force_reload=force_reload)
+
     def add_rules(self, rules):
         """Add new rules to the Rules object"""
         self.set_rules(rules, overwrite=False, use_conf=self.use_conf)
 
+    def set_rules(self, rules, overwrite=True, use_conf=False):
+        super(Enforcer, self).set_rules(rules, overwrite=overwrite,
+                                        use_conf=use_conf)
+        self._rule_set = None
+
+    def compiled_rules(self):
+        """Return the compiled form of the current rules.
+
+        The rules are compiled again, and the cached decisions dropped,
+        whenever they are replaced or added to.
+        """
+        self.load_rules()
+        rule_set = self._rule_set
+        # NOTE: A reloaded policy file may replace the rules without going
+        # through set_rules.
+        if rule_set is None or rule_set.rules is not self.rules:
+            self._decisions.clear()
+            rule_set = policy_compiler.RuleSet(self.rules, self)
+            self._rule_set = rule_set
+        return rule_set
+
+    def _decide(self, context, action, target):
+        """Return the decision for the action, from the cache if possible.
+
+        :param target: Dictionary representing the object of the action, or
+                       a callable returning it, only called when the rule
+                       depends on it.
+        """
+        rule_set = self.compiled_rules()
+        rule = rule_set.get(action)
+        key = None
+        if rule.role_only:
+            if self._decisions.maxsize:
+                key = action, frozenset(context.roles)
+                result = self._decisions.get(key, _MISSING)
+                if result is not _MISSING:
+                    _DECISION_HITS.inc()
+                    return result
+                _DECISION_MISSES.inc()
+            target = None
+        elif callable(target):
+            target = target()
+
+        credentials = {
+            'roles': context.roles,
+            'user': context.user,
+            'tenant': context.tenant,
+        }
+        result = rule(target, credentials, rule_set.role_mask(context.roles))
+        if key is not None:
+            self._decisions[key] = result
+        return result
+
     def enforce(self, context, action, target):
         """Verifies that the action is valid on the target in this context.
 
@@ -60,15 +167,10 @@ class Enforcer(policy.Enforcer):
            :raises: `glance.common.exception.Forbidden`
            :returns: A non-False value if access is allowed.
         """
-        credentials = {
-            'roles': context.roles,
-            'user': context.user,
-            'tenant': context.tenant,
-        }
-        return super(Enforcer, self).enforce(action, target, credentials,
-                                             do_raise=True,
-                                             exc=exception.Forbidden,
-                                             action=action)
+        result = self._decide(context, action, target)
+        if not result:
+            raise exception.Forbidden(action=action)
+        return result
 
     def check(self, context, action, target):
         """Verifies that the action is valid on the target in this context.
@@ -78,12 +180,7 @@ class Enforcer(policy.Enforcer):
            :param target: Dictionary representing the object of the action.
            :returns: A non-False value if access is allowed.
         """
-        credentials = {
-            'roles': context.roles,
-            'user': context.user,
-            'tenant': context.tenant,
-        }
-        return super(Enforcer, self).enforce(action, target, credentials)
+        return self._decide(context, action, target)
 
     def check_is_admin(self, context):
         """Check if the given context is associated with an admin role,
@@ -92,6 +189,21 @@ class Enforcer(policy.Enforcer):
            :param context: Glance request context
            :returns: A non-False value if context role is admin.
         """
-        return self.check(context, 'context_is_admin', context.to_dict())
-
-
+        # NOTE: The context is only serialized when the decision is not
+        # cached.
+        return self._decide(context, 'context_is_admin', context.to_dict)
+
+
+def get_enforcer():
+    """Return the enforcer shared by the request contexts of the process.
+
+    Building an enforcer looks the policy file up on disk and loads it, so
+    it should not be done per request. The shared enforcer still picks up
+    changes to the policy file, which oslo.policy reloads when its
+    modification time changes, and a policy file created after it was
+    built.
+    """
+    global _ENFORCER
+    if _ENFORCER is None:
+        _ENFORCER = Enforcer()
+    return _ENFORCER
@@ -0,0 +1,226 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compiler of oslo.policy rules into Python closures.
+
+Every role named by the rules is given a bit, and the roles of a request are
+turned into a bit mask once per decision, so that role checks and their
+``and``/``or`` combinations become a couple of integer operations instead of
+a walk of the check tree. Rule references are inlined. Checks which cannot
+be compiled, such as generic checks matching the target against the
+credentials or role checks substituted with the target, are evaluated by the
+oslo.policy interpreter.
+
+A compiled check is called as ``check(target, creds, mask)`` and has a
+``role_only`` attribute telling whether its result only depends on the
+roles.
+"""
+
+from oslo_policy import _checks
+
+
+def _constant(value):
+    def check(target, creds, mask):
+        return value
+    check.role_only = True
+    check.any_roles = None
+    check.all_roles = None
+    check.constant = value
+    return check
+
+
+TRUE = _constant(True)
+FALSE = _constant(False)
+
+
+def _roles(any_roles=None, all_roles=None):
+    """Compile a test of the role mask against bits.
+
+    :param any_roles: bits of which at least one must be set
+    :param all_roles: bits which must all be set
+    """
+    if any_roles is not None:
+        def check(target, creds, mask):
+            return bool(mask & any_roles)
+    else:
+        def check(target, creds, mask):
+            return mask & all_roles == all_roles
+    check.role_only = True
+    check.any_roles = any_roles
+    check.all_roles = all_roles
+    check.constant = None
+    return check
+
+
+def _wrap(func, role_only):
+    func.role_only = role_only
+    func.any_roles = None
+    func.all_roles = None
+    func.constant = None
+    return func
+
+
+class RuleSet(object):
+    """The compiled form of a set of rules.
+
+    :param rules: the `oslo_policy.policy.Rules` to compile
+    :param enforcer: the enforcer given to the checks evaluated by the
+                     interpreter
+    """
+
+    def __init__(self, rules, enforcer):
+        self.rules = rules
+        self.enforcer = enforcer
+        self.role_bits = {}
+        self.interpreted = 0
+        self._compiled = {}
+        self._compiling = set()
+        for name in list(rules):
+            self.get(name)
+
+    def role_mask(self, roles):
+        """Return the bit mask of the given roles."""
+        bits = self.role_bits
+        mask = 0
+        for role in roles:
+            mask |= bits.get(role.lower(), 0)
+        return mask
+
+    def get(self, name):
+        """Return the compiled check of a rule, or of the default rule."""
+        check = self._compiled.get(name)
+        if check is None:
+            if not self.rules:
+                check = FALSE
+            else:
+                check = self._compile_rule(name)
+            self._compiled[name] = check
+        return check
+
+    def _compile_rule(self, name):
+        try:
+            rule = self.rules[name]
+        except KeyError:
+            # NOTE: Like the interpreter, fail closed on missing rules.
+            return FALSE
+        self._compiling.add(name)
+        try:
+            return self._compile(rule)
+        finally:
+            self._compiling.discard(name)
+
+    def _bit(self, role):
+        bit = self.role_bits.get(role)
+        if bit is None:
+            bit = self.role_bits[role] = 1 << len(self.role_bits)
+        return bit
+
+    def _interpret(self, check):
+        self.interpreted += 1
+        enforcer = self.enforcer
+
+        def interpret(target, creds, mask):
+            return bool(check(target, creds, enforcer))
+        return _wrap(interpret, False)
+
+    def _compile(self, check):
+        if isinstance(check, _checks.TrueCheck):
+            return TRUE
+        if isinstance(check, _checks.FalseCheck):
+            return FALSE
+        if isinstance(check, _checks.RoleCheck):
+            if '%(' in check.match:
+                return self._interpret(check)
+            bit = self._bit(check.match.lower())
+            return _roles(any_roles=bit, all_roles=bit)
+        if isinstance(check, _checks.RuleCheck):
+            if check.match in self._compiling:
+                # NOTE: Recursive rules are left to the interpreter.
+                return self._interpret(check)
+            compiled = self._compiled.get(check.match)
+            if compiled is None:
+                compiled = self._compile_rule(check.match)
+                self._compiled[check.match] = compiled
+            return compiled
+        if isinstance(check, _checks.NotCheck):
+            return self._compile_not(self._compile(check.rule))
+        if isinstance(check, _checks.AndCheck):
+            return self._compile_and([self._compile(rule)
+                                      for rule in check.rules])
+        if isinstance(check, _checks.OrCheck):
+            return self._compile_or([self._compile(rule)
+                                     for rule in check.rules])
+        return self._interpret(check)
+
+    def _compile_not(self, child):
+        if child.constant is not None:
+            return FALSE if child.constant else TRUE
+
+        def negate(target, creds, mask):
+            return not child(target, creds, mask)
+        return _wrap(negate, child.role_only)
+
+    def _compile_and(self, children):
+        bits = 0
+        others = []
+        for child in children:
+            if child.constant is False:
+                return FALSE
+            if child.constant is True:
+                continue
+            if child.all_roles is not None:
+                bits |= child.all_roles
+            else:
+                others.append(child)
+        if bits:
+            others.insert(0, _roles(all_roles=bits))
+        if not others:
+            return TRUE
+        if len(others) == 1:
+            return others[0]
+
+        def all_of(target, creds, mask):
+            for child in others:
+                if not child(target, creds, mask):
+                    return False
+            return True
+        return _wrap(all_of, all(child.role_only for child in others))
+
+    def _compile_or(self, children):
+        bits = 0
+        others = []
+        for child in children:
+            if child.constant is True:
+                return TRUE
+            if child.constant is False:
+                continue
+            if child.any_roles is not None:
+                bits |= child.any_roles
+            else:
+                others.append(child)
+        if bits:
+            others.insert(0, _roles(any_roles=bits))
+        if not others:
+            return FALSE
+        if len(others) == 1:
+            return others[0]
+
+        def any_of(target, creds, mask):
+            for child in others:
+                if child(target, creds, mask):
+                    return True
+            return False
+        return _wrap(any_of, all(child.role_only for child in others))
@@ -40,14 +40,28 @@ from clictest.api import policy
 import clictest.api.v1
 from clictest.api.v1 import controller
 from clictest.common import exception
+from clictest.common import metrics
+from clictest.common import timeutils
+from clictest.common import timing
 from clictest.common import wsgi
 from clictest.i18n import _, _LE, _LI, _LW
 import requests
-import urllib
+from six.moves import urllib
 
 LOG = logging.getLogger(__name__)
 
+objectspy_opts = [
+    cfg.StrOpt('objectspy_url',
+               default='http://127.0.0.1:8080/ObjectSpyWeb',
+               help=_('Base URL of the ObjectSpyWeb service the objectspy '
+                      'requests are forwarded to, including the context '
+                      'path of the application. Defaults to a service '
+                      'running on the local host; set it to the address '
+                      'of the ObjectSpyWeb deployment.')),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(objectspy_opts)
 
 
 
@@ -71,7 +85,7 @@ class Controller(controller.BaseController):
     """
 
     def __init__(self):
-        pass
+        self._upstream_duration = metrics.UPSTREAM_DURATION.labels('objectspy')
 
     def _enforce(self, req, action, target=None):
         pass
@@ -80,13 +94,17 @@ class Controller(controller.BaseController):
         
         orgUrl = "http://"+url
         LOG.debug("Original URL = %s" % orgUrl)
-        url = 'http://81.134.193.73:8080/ObjectSpyWeb/services/objectspy/getObjectspyFile?userid=%s&projid=%s&browser=%s&url=%s&chvr=%s' % (userid,prjid,browser,orgUrl,chvr)
+        url = '%s/services/objectspy/getObjectspyFile?userid=%s&projid=%s&browser=%s&url=%s&chvr=%s' % (CONF.objectspy_url,userid,prjid,browser,orgUrl,chvr)
         
-        response = requests.get(url)
+        start = timeutils.now()
+        with timing.stage(req.environ, 'upstream'):
+            response = requests.get(url)
+        self._upstream_duration.observe(timeutils.now() - start)
         LOG.debug("*********** response captured in clictest service *********************")
         LOG.debug(response)
         
-        resp = urllib.quote(response.text)
+        with timing.stage(req.environ, 'quote'):
+            resp = urllib.parse.quote(response.text)
         return resp 
 
 def create_resource():
@@ -16,8 +16,8 @@
 from oslo_config import cfg
 from oslo_serialization import jsonutils
 from six.moves import http_client
-import webob.dec
 
+from clictest.common import json_engine
 from clictest.common import wsgi
 from clictest.i18n import _
 
@@ -62,15 +62,13 @@ class Controller(object):
             ])
 
         status = explicit and http_client.OK or http_client.MULTIPLE_CHOICES
-        response = webob.Response(request=req,
-                                  status=status,
-                                  content_type='application/json')
-        response.body = jsonutils.dump_as_bytes(dict(versions=version_objs))
-        return response
+        return wsgi.RawResponse(
+            '%d %s' % (status, http_client.responses[status]),
+            json_engine.get_engine().dumps(dict(versions=version_objs),
+                                           default=jsonutils.to_primitive))
 
-    @webob.dec.wsgify(RequestClass=wsgi.Request)
-    def __call__(self, req):
-        return self.index(req)
+    def __call__(self, environ, start_response):
+        return self.index(wsgi.get_request(environ))(environ, start_response)
 
 
 def create_resource(conf):
@@ -0,0 +1,441 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Asyncio clients of the API and of the RPC controllers.
+
+AsyncBaseClient and AsyncRPCClient have the API of BaseClient and RPCClient
+with coroutines instead of blocking calls: ``await client.do_request(...)``,
+``await client.bulk_request(...)`` and ``await client.method_name(**kw)``.
+Authentication, redirects and the mapping of status codes to exceptions are
+the ones of BaseClient. Connections are kept alive and at most
+MAX_CONNECTIONS of them are opened to a server at the same time, further
+requests waiting for one to be released, so that thousands of calls can be
+in flight in one process.
+
+Request bodies must be bytes, and responses are read entirely before being
+returned.
+
+This module requires Python 3.5 or later.
+"""
+
+import asyncio
+import collections
+import functools
+import ssl
+import time
+
+import osprofiler.web
+from six.moves import http_client
+
+from clictest.common import client
+from clictest.common import exception
+from clictest.common import rpc
+
+# connections opened to a server at the same time
+MAX_CONNECTIONS = 100
+
+
+def _default_port(url):
+    return 443 if url.scheme == 'https' else 80
+
+
+def _host_header(url):
+    """
+    Return the Host header of a URL, leaving out the default port of its
+    scheme, as redirect locations usually do.
+    """
+    host = url.hostname
+    if ':' in host:
+        host = '[%s]' % host
+    if url.port is None or url.port == _default_port(url):
+        return host
+    return '%s:%d' % (host, url.port)
+
+
+class AsyncResponse(object):
+    """
+    Response to a request of an AsyncBaseClient.
+
+    It is read entirely, so `read` returns the body right away.
+    """
+
+    def __init__(self, status, reason, headers, body=b''):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self._lookup = dict((name.lower(), value) for name, value in headers)
+
+    def getheader(self, name, default=None):
+        return self._lookup.get(name.lower(), default)
+
+    def getheaders(self):
+        return list(self.headers)
+
+    def read(self):
+        return self.body
+
+    def close(self):
+        pass
+
+
+class AsyncConnectionPool(object):
+    """
+    Pool of the keep-alive connections of asyncio clients.
+
+    :param max_size: maximum number of idle connections kept per server;
+                     0 disables keep-alive
+    :param max_idle: maximum number of seconds a connection is kept idle
+    :param max_connections: maximum number of connections opened to a
+                            server at the same time
+    """
+
+    def __init__(self, max_size=MAX_CONNECTIONS,
+                 max_idle=client.POOL_MAX_IDLE,
+                 max_connections=MAX_CONNECTIONS):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.max_connections = max_connections
+        self._idle = collections.defaultdict(collections.deque)
+        self._slots = {}
+
+    async def acquire(self, key, connect):
+        """
+        Return the reader and writer of a connection to a server, and
+        whether the connection is reused.
+
+        :param key: the key of the server
+        :param connect: coroutine function opening a new connection
+        """
+        slots = self._slots.get(key)
+        if slots is None:
+            slots = self._slots[key] = asyncio.Semaphore(
+                self.max_connections)
+        await slots.acquire()
+        try:
+            idle = self._idle.get(key)
+            while idle:
+                reader, writer, released = idle.pop()
+                # NOTE: The loop feeds the EOF of the connections closed by
+                # the server to their reader.
+                if (time.time() - released <= self.max_idle and
+                        not reader.at_eof() and
+                        not writer.transport.is_closing()):
+                    return reader, writer, True
+                writer.close()
+            reader, writer = await connect()
+            return reader, writer, False
+        except BaseException:
+            slots.release()
+            raise
+
+    def release(self, key, reader, writer, reusable):
+        """
+        Give back a connection, which is kept if `reusable`.
+        """
+        idle = self._idle[key]
+        if reusable and len(idle) < self.max_size:
+            idle.append((reader, writer, time.time()))
+        else:
+            writer.close()
+        self._slots[key].release()
+
+    def clear(self):
+        """
+        Close all the idle connections.
+        """
+        idle, self._idle = self._idle, collections.defaultdict(
+            collections.deque)
+        for connections in idle.values():
+            for reader, writer, released in connections:
+                writer.close()
+
+
+class AsyncBaseClient(client.BaseClient):
+
+    """A base asyncio client class"""
+
+    def __init__(self, *args, **kwargs):
+        """
+        Creates a new client to some service.
+
+        Takes the arguments of BaseClient, `connection_pool` being an
+        AsyncConnectionPool, by default a pool of its own.
+        """
+        connection_pool = kwargs.pop('connection_pool', None)
+        super(AsyncBaseClient, self).__init__(*args, **kwargs)
+        self.connection_pool = (connection_pool if connection_pool is not None
+                                else AsyncConnectionPool())
+        self._ssl_contexts = {}
+        self._auth_lock = None
+
+    async def do_request(self, method, action, body=None, headers=None,
+                         params=None):
+        """
+        Make a request, returning an AsyncResponse.
+
+        :param method: HTTP verb (GET, POST, PUT, etc.)
+        :param action: Requested path to append to self.doc_root
+        :param body: Bytes to send in the body of the request
+        :param headers: Headers to send with the request
+        :param params: Key/value pairs to use in query string
+        :returns: AsyncResponse object
+        """
+        token = self.auth_token
+        try:
+            return await self._authenticated_request(method, action, body,
+                                                     headers, params)
+        except exception.NotAuthenticated:
+            await self._async_authenticate(force_reauth=True, token=token)
+            return await self._authenticated_request(method, action, body,
+                                                     headers, params)
+
+    async def _authenticated_request(self, method, action, body, headers,
+                                     params):
+        if not self.auth_token:
+            await self._async_authenticate()
+
+        url = self._construct_url(action, params)
+        return await self._do_request(method, url, body, headers)
+
+    async def _async_authenticate(self, force_reauth=False, token=None):
+        """
+        Authenticate in an executor, once for all the pending requests.
+
+        :param token: the token rejected by the server; nothing is done if
+                      another request renewed it in the meantime
+        """
+        if self._auth_lock is None:
+            self._auth_lock = asyncio.Lock()
+        async with self._auth_lock:
+            if force_reauth and self.auth_token != token:
+                return
+            if not force_reauth and self.auth_token:
+                return
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(
+                None, functools.partial(self._authenticate, force_reauth))
+
+    async def _do_request(self, method, url, body, headers):
+        """
+        Issues a request and follows its redirects. Handles converting
+        any returned HTTP error status codes to OpenStack/Clictest
+        exceptions as BaseClient does.
+
+        :param method: HTTP method ("GET", "POST", "PUT", etc...)
+        :param url: urlparse.ParsedResult object with URL information
+        :param body: bytes to send, or None
+        :param headers: mapping of key/value pairs to add as headers
+        """
+        if body is not None and not isinstance(body, bytes):
+            raise TypeError('Unsupported body type: %s' % body.__class__)
+        for i in range(client.MAX_REDIRECTS):
+            try:
+                return await self._do_single_request(method, url, body,
+                                                     headers)
+            except exception.RedirectException as redirect:
+                if redirect.url is None:
+                    raise exception.InvalidRedirect()
+                url = redirect.url
+        raise exception.MaxRedirectsExceeded(redirects=client.MAX_REDIRECTS)
+
+    async def _do_single_request(self, method, url, body, headers):
+        if url.query:
+            path = url.path + "?" + url.query
+        else:
+            path = url.path
+
+        headers = self._encode_headers(headers or {})
+        headers.update(osprofiler.web.get_trace_id_headers())
+        if 'x-auth-token' not in headers and self.auth_token:
+            headers['x-auth-token'] = self.auth_token
+
+        try:
+            res = await asyncio.wait_for(
+                self._exchange(url, method, path, body, headers),
+                self.timeout)
+        except (OSError, ValueError, asyncio.IncompleteReadError,
+                asyncio.TimeoutError, http_client.HTTPException) as e:
+            raise exception.ClientConnectionError(e)
+
+        if res.status in self.OK_RESPONSE_CODES:
+            return res
+        self._raise_for_status(res, res.status)
+
+    async def _exchange(self, url, method, path, body, headers):
+        key = self._pool_key(url)
+        pool = self.connection_pool
+        head = self._request_head(url, method, path, body, headers)
+        for attempt in range(2):
+            reader, writer, reused = await pool.acquire(
+                key, functools.partial(self._connect, url))
+            reusable = False
+            try:
+                try:
+                    writer.write(head)
+                    if body:
+                        writer.write(body)
+                    await writer.drain()
+                    status_line = await reader.readline()
+                    if not status_line:
+                        raise http_client.BadStatusLine(status_line)
+                except (OSError, http_client.BadStatusLine):
+                    # NOTE: The server may close an idle connection just
+                    # as it is reused.
+                    if reused and not attempt:
+                        continue
+                    raise
+                res, reusable = await self._read_response(reader, method,
+                                                          status_line)
+                return res
+            finally:
+                pool.release(key, reader, writer, reusable)
+
+    async def _connect(self, url):
+        ssl_context = None
+        if url.scheme == 'https':
+            ssl_context = self._get_ssl_context()
+        return await asyncio.open_connection(
+            url.hostname, url.port or _default_port(url), ssl=ssl_context)
+
+    def _get_ssl_context(self):
+        key = tuple(sorted(self.connect_kwargs.items()))
+        context = self._ssl_contexts.get(key)
+        if context is None:
+            kwargs = self.connect_kwargs
+            context = ssl.create_default_context(cafile=kwargs.get('ca_file'))
+            if kwargs.get('insecure'):
+                context.check_hostname = False
+                context.verify_mode = ssl.CERT_NONE
+            if kwargs.get('cert_file'):
+                context.load_cert_chain(kwargs['cert_file'],
+                                        kwargs.get('key_file'))
+            self._ssl_contexts[key] = context
+        return context
+
+    @staticmethod
+    def _request_head(url, method, path, body, headers):
+        lines = ['%s %s HTTP/1.1' % (method, path),
+                 'Host: %s' % _host_header(url)]
+        lengths = [h for h in headers if h.lower() == 'content-length']
+        if body is not None or method.upper() in ('POST', 'PUT'):
+            for header in lengths:
+                del headers[header]
+            headers['Content-Length'] = len(body or b'')
+        for header, value in headers.items():
+            lines.append('%s: %s' % (header, value))
+        return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+    async def _read_response(self, reader, method, status_line):
+        """
+        Read a response, returning it and whether the connection can be
+        reused.
+        """
+        parts = status_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise http_client.BadStatusLine(status_line)
+        version, status = parts[0], int(parts[1])
+        reason = parts[2] if len(parts) > 2 else ''
+
+        headers = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, sep, value = line.decode('latin-1').partition(':')
+            headers.append((name.strip(), value.strip()))
+        res = AsyncResponse(status, reason, headers)
+
+        connection = (res.getheader('Connection') or '').lower()
+        reusable = (connection == 'keep-alive' or
+                    (version == 'HTTP/1.1' and connection != 'close'))
+        transfer_encoding = (res.getheader('Transfer-Encoding') or '').lower()
+        if (method.upper() == 'HEAD' or status < 200 or
+                status in (http_client.NO_CONTENT, http_client.NOT_MODIFIED)):
+            pass
+        elif 'chunked' in transfer_encoding:
+            res.body = await self._read_chunked(reader)
+        elif res.getheader('Content-Length') is not None:
+            res.body = await reader.readexactly(
+                int(res.getheader('Content-Length')))
+        else:
+            res.body = await reader.read()
+            reusable = False
+        return res, reusable
+
+    @staticmethod
+    async def _read_chunked(reader):
+        chunks = []
+        while True:
+            line = await reader.readline()
+            size = int(line.split(b';', 1)[0].strip(), 16)
+            if not size:
+                # NOTE: Skip the trailers.
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+
+class AsyncRPCClient(rpc.RPCClient, AsyncBaseClient):
+    """
+    Asyncio client of an RPC controller.
+
+    Takes the arguments of RPCClient, except `batch_window` and
+    `batch_size`: concurrent calls can be sent together with
+    ``bulk_request(commands, parallel=True)``.
+    """
+
+    async def bulk_request(self, commands, parallel=False):
+        """
+        Execute multiple commands in a single request.
+
+        :param commands: List of commands to send, as for RPCClient
+        :param parallel: Whether the commands are independent and may
+            be executed concurrently by the server.
+        """
+        if parallel:
+            commands = {'parallel': True, 'commands': commands}
+        response = await AsyncBaseClient.do_request(self, 'POST',
+                                                    self.base_path,
+                                                    self._dumps(commands))
+        return self._loads(response.read())
+
+    async def do_request(self, method, **kwargs):
+        """
+        Call a remote method.
+
+        :param method: The remote python method to call
+        :param kwargs: Dynamic parameters that will be
+            passed to the remote method.
+        """
+        content = await self.bulk_request([{'command': method,
+                                            'kwargs': kwargs}])
+        return self._check_result(content[0])
+
+    def __getattr__(self, item):
+        """
+        This method returns a coroutine function calling the remote
+        method.
+        """
+        if item.startswith('_'):
+            raise AttributeError(item)
+
+        async def method_proxy(**kw):
+            return await self.do_request(item, **kw)
+
+        return method_proxy
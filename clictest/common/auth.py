@@ -28,20 +28,169 @@ Keystone (an identity management system).
     > auth_plugin.management_url
     http://service_endpoint/
 """
+import calendar
+import errno
+import hashlib
+import hmac
+import os
+import tempfile
+import threading
+import time
+import weakref
+
 import httplib2
-from keystoneclient import service_catalog as ks_service_catalog
+from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_serialization import jsonutils
+import six
 # NOTE(jokke): simplified transition to py3, behaves like py2 xrange
 from six.moves import range
 import six.moves.urllib.parse as urlparse
 
 from clictest.common import exception
-from clictest.i18n import _
+from clictest.common import timeutils
+from clictest.common import utils
+from clictest.i18n import _, _LW
 
 
 LOG = logging.getLogger(__name__)
 
+auth_opts = [
+    cfg.StrOpt('token_cache_dir',
+               help=_('Directory where the Keystone tokens of the clients '
+                      'are cached, so that they are shared by the processes '
+                      'authenticating with the same credentials. Tokens are '
+                      'only cached by each client when it is not set.')),
+    cfg.IntOpt('token_cache_ttl', default=3600, min=0,
+               help=_('Seconds the tokens whose expiry is unknown, such as '
+                      'the tokens of the v1 authentication, are cached.')),
+    cfg.IntOpt('token_cache_margin', default=60, min=0,
+               help=_('Seconds before their expiry after which cached tokens '
+                      'are no longer used.')),
+    cfg.IntOpt('service_catalog_cache_size', default=128, min=0,
+               help=_('Maximum number of parsed service catalogs cached, '
+                      'along with an index of their endpoints, to resolve '
+                      'the X-Service-Catalog headers seen before without '
+                      'parsing them again. Set to 0 to disable the '
+                      'cache.')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(auth_opts)
+
+_HTTP = threading.local()
+
+
+def _get_http(insecure):
+    """
+    Return the HTTP client of the thread, which keeps its connections to
+    the authentication servers alive.
+    """
+    clients = getattr(_HTTP, 'clients', None)
+    if clients is None:
+        clients = _HTTP.clients = {}
+    conn = clients.get(insecure)
+    if conn is None:
+        conn = clients[insecure] = httplib2.Http()
+        conn.force_exception_to_status_code = True
+        conn.disable_ssl_certificate_validation = insecure
+    return conn
+
+
+class TokenCache(object):
+    """
+    Cache of tokens shared by processes through files.
+
+    Every entry is a JSON file named after the hash of its key, replaced
+    atomically and only readable by its owner. Entries are also kept in
+    memory until they expire.
+
+    :param directory: the directory of the files
+    :param margin: seconds before their expiry after which entries are
+                   considered expired
+    """
+
+    def __init__(self, directory, margin=60):
+        self.directory = directory
+        self.margin = margin
+        self._entries = {}
+
+    def _path(self, key):
+        name = hashlib.sha256(jsonutils.dump_as_bytes(key)).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def _valid(self, entry):
+        return (entry is not None and
+                entry.get('expires', 0) - self.margin > time.time())
+
+    def _read(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                entry = jsonutils.loads(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+        return entry if entry.get('key') == list(key) else None
+
+    def get(self, key):
+        """Return the unexpired entry of a key, or None."""
+        entry = self._entries.get(key)
+        if not self._valid(entry):
+            entry = self._read(key)
+            if not self._valid(entry):
+                self._entries.pop(key, None)
+                return None
+            self._entries[key] = entry
+        return entry
+
+    def set(self, key, entry):
+        """
+        Store an entry, which has an ``expires`` timestamp.
+        """
+        entry = dict(entry, key=list(key))
+        self._entries[key] = entry
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0o700)
+            fd, tmp = tempfile.mkstemp(dir=self.directory)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(jsonutils.dump_as_bytes(entry))
+                os.rename(tmp, self._path(key))
+            except Exception:
+                os.unlink(tmp)
+                raise
+        except (IOError, OSError) as e:
+            LOG.warn(_LW("Could not cache the token in %(dir)s: %(e)s"),
+                     {'dir': self.directory, 'e': e})
+
+    def delete(self, key, token):
+        """Drop the entry of a key if it holds `token`."""
+        entry = self._entries.get(key)
+        if entry is not None and entry.get('token') == token:
+            del self._entries[key]
+        entry = self._read(key)
+        if entry is not None and entry.get('token') == token:
+            try:
+                os.unlink(self._path(key))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+
+
+_TOKEN_CACHES = {}
+
+
+def get_token_cache():
+    """Return the configured TokenCache, or None."""
+    directory = CONF.token_cache_dir
+    if not directory:
+        return None
+    cache = _TOKEN_CACHES.get(directory)
+    if cache is None:
+        cache = _TOKEN_CACHES[directory] = TokenCache(
+            directory, CONF.token_cache_margin)
+    return cache
+
 
 class BaseStrategy(object):
     def __init__(self):
@@ -81,6 +230,9 @@ class KeystoneStrategy(BaseStrategy):
         self.creds = creds
         self.insecure = insecure
         self.configure_via_auth = configure_via_auth
+        # NOTE: The auth_url of the creds is updated after redirections.
+        self.creds_auth_url = creds.get('auth_url')
+        self._expires = None
         super(KeystoneStrategy, self).__init__()
 
     def check_auth_params(self):
@@ -125,6 +277,22 @@ class KeystoneStrategy(BaseStrategy):
                 self._v1_auth(token_url)
 
         self.check_auth_params()
+        cache = get_token_cache()
+        key = self._cache_key()
+        if cache is not None:
+            if self.auth_token is not None:
+                # NOTE: Asked to authenticate again, the token was rejected.
+                cache.delete(key, self.auth_token)
+            entry = cache.get(key)
+            if entry is not None and (entry.get('management_url') or
+                                      not self.configure_via_auth):
+                self.auth_token = entry['token']
+                if self.configure_via_auth:
+                    self.management_url = entry['management_url']
+                self.creds['auth_url'] = entry['auth_url']
+                return
+
+        self._expires = None
         auth_url = self.creds['auth_url']
         for redirect_iter in range(self.MAX_REDIRECTS):
             try:
@@ -147,6 +315,27 @@ class KeystoneStrategy(BaseStrategy):
             # Guard against a redirection loop
             raise exception.MaxRedirectsExceeded(redirects=self.MAX_REDIRECTS)
 
+        if cache is not None:
+            expires = self._expires
+            if expires is None:
+                expires = time.time() + CONF.token_cache_ttl
+            cache.set(key, {'token': self.auth_token,
+                            'management_url': self.management_url,
+                            'auth_url': auth_url,
+                            'expires': expires})
+
+    def _cache_key(self):
+        creds = self.creds
+        identity = (self.creds_auth_url, creds['username'],
+                    creds.get('tenant'), creds.get('region'))
+        # NOTE: Only the clients knowing the password find the token.
+        password = creds.get('password') or ''
+        if isinstance(password, six.text_type):
+            password = password.encode('utf-8')
+        secret = hmac.new(password, jsonutils.dump_as_bytes(identity),
+                          hashlib.sha256).hexdigest()
+        return identity + (secret,)
+
     def _v1_auth(self, token_url):
         creds = self.creds
 
@@ -217,6 +406,10 @@ class KeystoneStrategy(BaseStrategy):
                                         endpoint_region=creds_region)
                 self.management_url = endpoint
             self.auth_token = resp_auth['token']['id']
+            expires = resp_auth['token'].get('expires')
+            if expires:
+                self._expires = calendar.timegm(timeutils.normalize_time(
+                    timeutils.parse_isotime(expires)).timetuple())
         elif resp.status == 305:
             raise exception.RedirectException(resp['location'])
         elif resp.status == 400:
@@ -238,9 +431,7 @@ class KeystoneStrategy(BaseStrategy):
 
     def _do_request(self, url, method, headers=None, body=None):
         headers = headers or {}
-        conn = httplib2.Http()
-        conn.force_exception_to_status_code = True
-        conn.disable_ssl_certificate_validation = self.insecure
+        conn = _get_http(self.insecure)
         headers['User-Agent'] = 'clictest-client'
         resp, resp_body = conn.request(url, method, headers=headers, body=body)
         return resp, resp_body
@@ -257,6 +448,119 @@ def get_plugin_from_strategy(strategy, creds=None, insecure=False,
         raise Exception(_("Unknown auth strategy '%s'") % strategy)
 
 
+class _ReadOnlyDict(dict):
+    """Dictionary of a parsed service catalog, which may be shared."""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(_('Service catalogs are read-only'))
+
+    __setitem__ = __delitem__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return _ReadOnlyDict, (dict(self),)
+
+
+def _freeze(obj):
+    """Return a read-only copy of a parsed JSON document."""
+    if isinstance(obj, dict):
+        return _ReadOnlyDict((key, _freeze(value))
+                             for key, value in obj.items())
+    if isinstance(obj, list):
+        return tuple(_freeze(value) for value in obj)
+    return obj
+
+
+class ServiceCatalog(object):
+    """
+    A parsed v2 service catalog, with an index of the URLs of its endpoints
+    by service type, region and endpoint type.
+
+    The catalog must not be modified once indexed.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self._index = {}
+        for service in catalog or []:
+            service_type = service.get('type')
+            if service_type is None:
+                continue
+            for endpoint in service.get('endpoints', []):
+                region = endpoint.get('region_id') or endpoint.get('region')
+                for endpoint_type, url in endpoint.items():
+                    if 'URL' not in endpoint_type:
+                        continue
+                    keys = [(service_type, None, endpoint_type)]
+                    if region:
+                        keys.append((service_type, region, endpoint_type))
+                    for key in keys:
+                        self._index.setdefault(key, []).append(url)
+
+    def get_urls(self, service_type='image', region=None,
+                 endpoint_type='publicURL'):
+        """
+        Return the URLs of the endpoints matching both type and region, in
+        the order of the catalog, or None if there is none. Endpoints of any
+        region match when no region is given.
+        """
+        if 'URL' not in endpoint_type:
+            endpoint_type += 'URL'
+        urls = self._index.get((service_type, region or None, endpoint_type))
+        return tuple(urls) if urls else None
+
+
+_CATALOGS = None
+
+# ServiceCatalogs by id of their catalog, so that get_endpoint finds the
+# index of the catalogs handed out by parse_service_catalog.
+_INDEXES = weakref.WeakValueDictionary()
+
+
+def _get_catalog_cache():
+    global _CATALOGS
+    if _CATALOGS is None or (_CATALOGS.maxsize !=
+                             CONF.service_catalog_cache_size):
+        _CATALOGS = utils.LRUCache(CONF.service_catalog_cache_size)
+    return _CATALOGS
+
+
+def parse_service_catalog(catalog_header):
+    """
+    Parse a JSON service catalog, such as the X-Service-Catalog header set
+    by keystonemiddleware, into a ServiceCatalog.
+
+    The ServiceCatalog of every header is cached, so that the catalog is
+    parsed and indexed once however many requests carry it, and requests
+    carrying the same header share the same catalog. The catalog is made
+    of tuples and read-only dictionaries so that it cannot be modified.
+
+    :param catalog_header: JSON service catalog, as text or bytes
+    :raises: ValueError: when the catalog is not valid JSON
+    """
+    if isinstance(catalog_header, six.text_type):
+        catalog_header = catalog_header.encode('utf-8')
+    cache = _get_catalog_cache()
+    key = None
+    if cache.maxsize:
+        key = hashlib.sha256(catalog_header).hexdigest()
+        service_catalog = cache.get(key)
+        if service_catalog is not None:
+            return service_catalog
+    service_catalog = ServiceCatalog(
+        _freeze(jsonutils.loads(catalog_header)))
+    _INDEXES[id(service_catalog.catalog)] = service_catalog
+    if key is not None:
+        cache[key] = service_catalog
+    return service_catalog
+
+
 def get_endpoint(service_catalog, service_type='image', endpoint_region=None,
                  endpoint_type='publicURL'):
     """
@@ -268,12 +572,17 @@ def get_endpoint(service_catalog, service_type='image', endpoint_region=None,
     is considered a match. There must be one -- and
     only one -- successful match in the catalog,
     otherwise we will raise an exception.
+
+    :param service_catalog: list of services, or ServiceCatalog
     """
-    endpoints = ks_service_catalog.ServiceCatalogV2(
-        {'serviceCatalog': service_catalog}
-    ).get_urls(service_type=service_type,
-               region_name=endpoint_region,
-               endpoint_type=endpoint_type)
+    if not isinstance(service_catalog, ServiceCatalog):
+        indexed = _INDEXES.get(id(service_catalog))
+        if indexed is None or indexed.catalog is not service_catalog:
+            indexed = ServiceCatalog(service_catalog)
+        service_catalog = indexed
+    endpoints = service_catalog.get_urls(service_type=service_type,
+                                         region=endpoint_region,
+                                         endpoint_type=endpoint_type)
     if endpoints is None:
         raise exception.NoServiceEndpoint()
     elif len(endpoints) == 1:
@@ -18,19 +18,28 @@
 #   577548-https-httplib-client-connection-with-certificate-v/
 
 import collections
-import copy
 import errno
 import functools
+import hashlib
+import itertools
 import os
 import re
+import sys
+import time
 
 try:
+    from eventlet.green import select
     from eventlet.green import socket
     from eventlet.green import ssl
+    from eventlet.hubs import trampoline
 except ImportError:
+    import select
     import socket
     import ssl
+    trampoline = None
 
+import eventlet
+from eventlet import queue
 import osprofiler.web
 
 try:
@@ -50,7 +59,7 @@ import six.moves.urllib.parse as urlparse
 from clictest.common import auth
 from clictest.common import exception
 from clictest.common import utils
-from clictest.i18n import _
+from clictest.i18n import _, _LW
 
 LOG = logging.getLogger(__name__)
 
@@ -59,6 +68,38 @@ CHUNKSIZE = 65536
 
 VERSION_REGEX = re.compile(r"/?v[0-9\.]+")
 
+MAX_REDIRECTS = 5
+
+# smallest range of a resource downloaded in parallel
+RANGE_MIN_SIZE = 16 * CHUNKSIZE
+# largest default range of a resource iterated over
+RANGE_ITER_SIZE = 128 * CHUNKSIZE
+
+# room for the size of a chunk, in hex, and the CRLF following it
+_CHUNK_HEADER_SIZE = len('%x\r\n' % CHUNKSIZE)
+
+# bytes of a non-seekable request body kept to send it again
+SPOOL_SIZE = 16 * CHUNKSIZE
+
+# idle keep-alive connections kept per server, and for how many seconds
+POOL_MAX_SIZE = 10
+POOL_MAX_IDLE = 60
+
+
+def _write_at(fd, offset, data):
+    """Write all of `data` at `offset` of a file, leaving its offset as is."""
+    data = memoryview(data)
+    while data:
+        if hasattr(os, 'pwrite'):
+            written = os.pwrite(fd, data, offset)
+        else:
+            # NOTE: Without os.pwrite (Python 2), the seek and the write do
+            # not yield to other green threads so they cannot interleave.
+            os.lseek(fd, offset, os.SEEK_SET)
+            written = os.write(fd, data)
+        data = data[written:]
+        offset += written
+
 
 def handle_unauthenticated(func):
     """
@@ -78,8 +119,6 @@ def handle_redirects(func):
     """
     Wrap the _do_request function to handle HTTP redirects.
     """
-    MAX_REDIRECTS = 5
-
     @functools.wraps(func)
     def wrapped(self, method, url, body, headers):
         for i in range(MAX_REDIRECTS):
@@ -137,6 +176,272 @@ class HTTPSClientAuthConnection(http_client.HTTPSConnection):
                                         cert_reqs=ssl.CERT_REQUIRED)
 
 
+def _sendmsg_all(sock, buffers):
+    """
+    Send all the buffers with as few system calls as possible.
+    """
+    buffers = [memoryview(buf) for buf in buffers]
+    while buffers:
+        try:
+            sent = sock.sendmsg(buffers)
+        except socket.error as e:
+            if (trampoline is None or
+                    e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK)):
+                raise
+            # NOTE: sendmsg() is not green, it is the one of the
+            # non-blocking socket underneath the green socket.
+            trampoline(sock, write=True, timeout=sock.gettimeout(),
+                       timeout_exc=socket.timeout(_('timed out')))
+            continue
+        while buffers and sent >= buffers[0].nbytes:
+            sent -= buffers.pop(0).nbytes
+        if sent:
+            buffers[0] = buffers[0][sent:]
+
+
+class RequestBody(object):
+    """
+    Body of a request which can be sent more than once.
+
+    Bytes are kept by reference, text is encoded to UTF-8 and seekable
+    files are rewound to the position they were at. Other files and
+    iterables are spooled while being sent, up to `spool_size` bytes, and
+    sent again from the spool once they were read to their end.
+
+    :param body: data to send (as bytes, text, filelike or iterable), or
+                 None
+    :param spool_size: maximum number of bytes spooled
+    """
+
+    def __init__(self, body, spool_size=SPOOL_SIZE):
+        if isinstance(body, six.text_type):
+            # NOTE: Text would otherwise be sent one character at a time.
+            body = encodeutils.safe_encode(body)
+        self.body = body
+        self.spool_size = spool_size
+        self._start = None
+        self._spool = None
+        self._spooled = False
+        self._complete = False
+        if body is None or isinstance(body, bytes):
+            return
+        if hasattr(body, 'read'):
+            try:
+                self._start = body.tell()
+                body.seek(self._start)
+            except (AttributeError, IOError, OSError, ValueError):
+                self._start = None
+        if self._start is None:
+            self._spool = []
+            self._size = 0
+
+    def rewind(self):
+        """
+        Return the body to send, from its start.
+
+        :raises BodyNotReplayable: if the body was not entirely spooled, or
+                                   was not read to its end
+        """
+        if self._start is not None:
+            self.body.seek(self._start)
+            return self.body
+        if self._spool is None:
+            if self._spooled:
+                raise exception.BodyNotReplayable(
+                    reason=_('it is larger than the %d bytes kept') %
+                    self.spool_size)
+            return self.body
+        if self._spooled:
+            if not self._complete:
+                raise exception.BodyNotReplayable(
+                    reason=_('it was only partly read'))
+            return iter(self._spool)
+        self._spooled = True
+        if hasattr(self.body, 'read'):
+            return SpoolingReader(self.body, self._record, self._finish)
+        return self._spooling(self.body)
+
+    def _record(self, data):
+        if self._spool is None:
+            return
+        self._size += len(data)
+        if self._size <= self.spool_size:
+            self._spool.append(bytes(data))
+        else:
+            self._spool = None
+
+    def _finish(self):
+        self._complete = True
+
+    def _spooling(self, chunks):
+        for chunk in chunks:
+            self._record(chunk)
+            yield chunk
+        self._finish()
+
+
+class SpoolingReader(object):
+    """
+    File-like object reading from another one and recording what it reads.
+
+    :param fp: the file-like object to read from
+    :param record: called with the data read
+    :param finish: called once the end of the file is read
+    """
+
+    def __init__(self, fp, record, finish):
+        self._fp = fp
+        self._record = record
+        self._finish = finish
+
+    def read(self, size=-1):
+        data = self._fp.read(size)
+        if data:
+            self._record(data)
+        elif size != 0:
+            self._finish()
+        return data
+
+    def readinto(self, buf):
+        readinto = getattr(self._fp, 'readinto', None)
+        if readinto is not None:
+            size = readinto(buf)
+        else:
+            data = self._fp.read(len(buf))
+            size = len(data)
+            buf[:size] = data
+        if size:
+            self._record(memoryview(buf)[:size])
+        elif len(buf):
+            self._finish()
+        return size
+
+
+class ConnectionPool(object):
+    """
+    Pool of idle keep-alive HTTP connections.
+
+    Connections are kept by key, which identifies the server and the way
+    the connections to it are made, and the most recently released ones
+    are reused first. Connections idle for more than `max_idle` seconds,
+    or which the server has closed, are dropped on checkout. A process
+    forked from the one which filled the pool, like an API worker, starts
+    with an empty pool rather than sharing the sockets of its parent.
+
+    :param max_size: maximum number of idle connections kept per key; 0
+                     disables keep-alive
+    :param max_idle: maximum number of seconds a connection is kept idle
+    """
+
+    def __init__(self, max_size=POOL_MAX_SIZE, max_idle=POOL_MAX_IDLE):
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self._idle = collections.defaultdict(collections.deque)
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self.clear()
+
+    def get(self, key):
+        """
+        Return an idle connection to reuse, or None.
+        """
+        self._check_pid()
+        idle = self._idle.get(key)
+        while idle:
+            try:
+                connection, released = idle.pop()
+            except IndexError:
+                # NOTE: Taken by another thread in the meantime.
+                break
+            if (time.time() - released <= self.max_idle and
+                    self._is_alive(connection)):
+                return connection
+            connection.close()
+        return None
+
+    def put(self, key, connection):
+        """
+        Keep a connection whose last response was fully read.
+        """
+        self._check_pid()
+        idle = self._idle[key]
+        if len(idle) >= self.max_size:
+            connection.close()
+        else:
+            idle.append((connection, time.time()))
+
+    def clear(self):
+        """
+        Close all the idle connections.
+        """
+        idle, self._idle = self._idle, collections.defaultdict(
+            collections.deque)
+        for connections in idle.values():
+            for connection, released in connections:
+                connection.close()
+
+    @staticmethod
+    def _is_alive(connection):
+        # NOTE: An idle connection has nothing to read, unless the server
+        # closed it or sent something unexpected.
+        sock = connection.sock
+        if sock is None:
+            return False
+        try:
+            return not select.select([sock], [], [], 0)[0]
+        except (socket.error, ValueError):
+            return False
+
+
+class PooledResponse(object):
+    """
+    HTTP response giving its connection back to a pool once fully read.
+
+    :param response: the response read from `connection`
+    :param pool: the ConnectionPool the connection goes back to
+    :param key: the key of the connection in the pool
+    :param connection: the connection the response is read from
+    """
+
+    def __init__(self, response, pool, key, connection):
+        self._response = response
+        self._pool = pool
+        self._key = key
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def read(self, *args):
+        data = self._response.read(*args)
+        if self._response.isclosed():
+            self._release()
+        return data
+
+    def close(self):
+        self._response.close()
+        if self._connection is not None:
+            # NOTE: The rest of the body was never read, the connection
+            # cannot be reused.
+            self._connection.close()
+            self._connection = None
+
+    def _release(self):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        if self._response.will_close:
+            connection.close()
+        else:
+            self._pool.put(self._key, connection)
+
+
+_CONNECTION_POOL = ConnectionPool()
+
+
 class BaseClient(object):
 
     """A base client class"""
@@ -155,6 +460,7 @@ class BaseClient(object):
         http_client.CREATED,
         http_client.ACCEPTED,
         http_client.NO_CONTENT,
+        http_client.PARTIAL_CONTENT,
     )
 
     REDIRECT_RESPONSE_CODES = (
@@ -168,7 +474,7 @@ class BaseClient(object):
     def __init__(self, host, port=None, timeout=None, use_ssl=False,
                  auth_token=None, creds=None, doc_root=None, key_file=None,
                  cert_file=None, ca_file=None, insecure=False,
-                 configure_via_auth=True):
+                 configure_via_auth=True, connection_pool=None):
         """
         Creates a new client to some service.
 
@@ -202,6 +508,9 @@ class BaseClient(object):
                          URL returned from the service catalog for the image
                          endpoint will **override** the URL supplied to in
                          the host parameter.
+        :param connection_pool: Optional. The ConnectionPool keeping the
+                         connections alive between requests. Defaults to a
+                         pool shared by all the clients of the process.
         """
         self.host = host
         self.port = port or self.DEFAULT_PORT
@@ -225,6 +534,8 @@ class BaseClient(object):
         self.insecure = insecure
         self.auth_plugin = self.make_auth_plugin(self.creds, self.insecure)
         self.connect_kwargs = self.get_connect_kwargs()
+        self.connection_pool = (connection_pool if connection_pool is not None
+                                else _CONNECTION_POOL)
 
     def get_connect_kwargs(self):
         # Both secure and insecure connections have a timeout option
@@ -331,6 +642,13 @@ class BaseClient(object):
         else:
             return http_client.HTTPConnection
 
+    def _pool_key(self, url):
+        """
+        Returns the key of the connections to the server of a URL
+        """
+        return (url.scheme, url.hostname, url.port,
+                tuple(sorted(self.connect_kwargs.items())))
+
     def _authenticate(self, force_reauth=False):
         """
         Use the authentication plugin to authenticate and set the auth token.
@@ -348,7 +666,6 @@ class BaseClient(object):
         if management_url and self.configure_via_auth:
             self.configure_from_url(management_url)
 
-    @handle_unauthenticated
     def do_request(self, method, action, body=None, headers=None,
                    params=None):
         """
@@ -361,16 +678,230 @@ class BaseClient(object):
         :param params: Key/value pairs to use in query string
         :returns: HTTP response object
         """
+        # NOTE(ameade): The body can be consumed by _do_request but we need
+        # the original if handle_unauthenticated sends the request again.
+        return self._authenticated_request(method, action,
+                                           RequestBody(body), headers, params)
+
+    @handle_unauthenticated
+    def _authenticated_request(self, method, action, body, headers, params):
         if not self.auth_token:
             self._authenticate()
 
         url = self._construct_url(action, params)
-        # NOTE(ameade): We need to copy these kwargs since they can be altered
-        # in _do_request but we need the originals if handle_unauthenticated
-        # calls this function again.
-        return self._do_request(method=method, url=url,
-                                body=copy.deepcopy(body),
-                                headers=copy.deepcopy(headers))
+        return self._do_request(method=method, url=url, body=body.rewind(),
+                                headers=headers)
+
+    def download(self, action, path=None, ranges=4, range_size=None,
+                 checksum=None, checksum_algorithm='md5', retries=3,
+                 headers=None, params=None):
+        """
+        Download a resource, fetching ranges of it in parallel.
+
+        When the server accepts byte ranges for the resource, `ranges`
+        ranges of it are fetched at the same time, and a range failing
+        midway is resumed where it stopped. Otherwise the resource is
+        downloaded in a single stream.
+
+        :param action: Requested path to append to self.doc_root
+        :param path: File the resource is written to. If None, an iterator
+                     over the content of the resource, in order, is
+                     returned instead.
+        :param ranges: Number of ranges fetched at the same time
+        :param range_size: Size of the ranges. Defaults to the size of the
+                           resource divided by `ranges` when writing to a
+                           file, and to at most RANGE_ITER_SIZE when
+                           iterating, since that many ranges are then held
+                           in memory.
+        :param checksum: Optional hex digest the content must have
+        :param checksum_algorithm: hashlib algorithm of the checksum
+        :param retries: Number of times a range is resumed after a failure
+        :param headers: Headers to send with the requests
+        :param params: Key/value pairs to use in query string
+        :returns: the size of the resource if `path` is given, an iterator
+                  over its content otherwise
+        :raises ChecksumMismatch: if the content does not match `checksum`,
+                                  once it is entirely written or iterated
+        """
+        res = self.do_request('HEAD', action, headers=headers, params=params)
+        res.read()
+        size = res.getheader('Content-Length')
+        spans = []
+        if (res.getheader('Accept-Ranges', '').lower() == 'bytes' and
+                size is not None and ranges > 1):
+            size = int(size)
+            if range_size is None:
+                range_size = max(RANGE_MIN_SIZE, -(-size // ranges))
+                if path is None:
+                    range_size = min(range_size, RANGE_ITER_SIZE)
+            spans = [(start, min(start + range_size, size) - 1)
+                     for start in range(0, size, range_size)]
+
+        def fetch(span, write):
+            self._download_range(action, span[0], span[1], write, retries,
+                                 headers, params)
+
+        if path is None:
+            if len(spans) < 2:
+                return self._iter_stream(action, checksum, checksum_algorithm,
+                                         headers, params)
+            return self._iter_ranges(action, spans, ranges, fetch, checksum,
+                                     checksum_algorithm)
+
+        if len(spans) < 2:
+            # NOTE: The resource is a single range, of unknown size.
+            spans = [(0, None)]
+        # NOTE: A single stream is written in order, so it is hashed as it
+        # is written. Ranges complete in any order and are hashed from the
+        # file once they are all written.
+        digest = hashlib.new(checksum_algorithm)
+        hash_stream = checksum is not None and len(spans) == 1
+        written = [0]
+
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o666)
+        try:
+            if spans[0][1] is not None:
+                os.ftruncate(fd, size)
+
+            def write(offset, data):
+                _write_at(fd, offset, data)
+                written[0] += len(data)
+                if hash_stream:
+                    digest.update(data)
+
+            pool = eventlet.GreenPool(min(ranges, len(spans)))
+            finished = queue.LightQueue()
+            running = {}
+            pending = iter(spans)
+
+            def fetch_to_file(span):
+                try:
+                    fetch(span, write)
+                except Exception:
+                    finished.put((span, sys.exc_info()))
+                else:
+                    finished.put((span, None))
+
+            def start(count):
+                for span in itertools.islice(pending, count):
+                    running[span] = pool.spawn(fetch_to_file, span)
+
+            start(pool.size)
+            try:
+                while running:
+                    span, exc_info = finished.get()
+                    del running[span]
+                    if exc_info is not None:
+                        six.reraise(*exc_info)
+                    start(1)
+            finally:
+                for thread in running.values():
+                    thread.kill()
+        finally:
+            os.close(fd)
+
+        if checksum is not None and not hash_stream:
+            with open(path, 'rb') as f:
+                for chunk in utils.chunkiter(f, CHUNKSIZE):
+                    digest.update(chunk)
+        self._verify_checksum(action, digest, checksum)
+        return written[0]
+
+    def _iter_stream(self, action, checksum, checksum_algorithm, headers,
+                     params):
+        digest = hashlib.new(checksum_algorithm)
+        res = self.do_request('GET', action, headers=headers, params=params)
+        for chunk in utils.chunkiter(res, CHUNKSIZE):
+            if checksum is not None:
+                digest.update(chunk)
+            yield chunk
+        self._verify_checksum(action, digest, checksum)
+
+    def _iter_ranges(self, action, spans, ranges, fetch, checksum,
+                     checksum_algorithm):
+        def fetch_to_memory(span):
+            chunks = []
+            try:
+                fetch(span, lambda offset, data: chunks.append(data))
+            except Exception:
+                return None, sys.exc_info()
+            return chunks, None
+
+        digest = hashlib.new(checksum_algorithm)
+        pool = eventlet.GreenPool(min(ranges, len(spans)))
+        # NOTE: At most `ranges` ranges are fetched ahead of the one being
+        # iterated.
+        spans = iter(spans)
+        fetching = collections.deque(
+            pool.spawn(fetch_to_memory, span)
+            for span in itertools.islice(spans, ranges))
+        try:
+            while fetching:
+                chunks, exc_info = fetching[0].wait()
+                fetching.popleft()
+                if exc_info is not None:
+                    six.reraise(*exc_info)
+                for span in itertools.islice(spans, 1):
+                    fetching.append(pool.spawn(fetch_to_memory, span))
+                for chunk in chunks:
+                    if checksum is not None:
+                        digest.update(chunk)
+                    yield chunk
+        finally:
+            for thread in fetching:
+                thread.kill()
+        self._verify_checksum(action, digest, checksum)
+
+    @staticmethod
+    def _verify_checksum(action, digest, checksum):
+        if checksum is not None and digest.hexdigest() != checksum.lower():
+            raise exception.ChecksumMismatch(resource=action,
+                                             actual=digest.hexdigest(),
+                                             expected=checksum)
+
+    def _download_range(self, action, start, end, write, retries, headers,
+                        params):
+        """
+        Download a range of a resource, resuming it after failures.
+
+        :param start: offset of the first byte of the range
+        :param end: offset of the last byte of the range, or None for the
+                    whole resource
+        :param write: called with the offset and the data of every chunk
+        """
+        offset = start
+        for attempt in range(retries + 1):
+            range_headers = dict(headers or {})
+            if end is not None or offset:
+                range_headers['Range'] = 'bytes=%d-%s' % (
+                    offset, '' if end is None else end)
+            try:
+                res = self.do_request('GET', action, headers=range_headers,
+                                      params=params)
+                if 'Range' in range_headers:
+                    status_code = self.get_status_code(res)
+                    content_range = res.getheader('Content-Range', '')
+                    if (status_code != http_client.PARTIAL_CONTENT or
+                            not content_range.startswith(
+                                'bytes %d-' % offset)):
+                        res.close()
+                        raise exception.UnexpectedStatus(status=status_code,
+                                                         body=content_range)
+                for chunk in utils.chunkiter(res, CHUNKSIZE):
+                    write(offset, chunk)
+                    offset += len(chunk)
+                if end is None or offset > end:
+                    return
+                error = http_client.IncompleteRead(b'', end + 1 - offset)
+            except (socket.error, IOError, http_client.HTTPException,
+                    exception.ClientConnectionError, exception.ServerError,
+                    exception.ServiceUnavailable) as e:
+                error = e
+            LOG.warn(_LW("Download of bytes %(start)d-%(end)s of "
+                         "%(action)s failed at %(offset)d: %(error)s"),
+                     {'start': start, 'end': end, 'action': action,
+                      'offset': offset, 'error': error})
+        raise error
 
     def _construct_url(self, action, params=None):
         """
@@ -382,14 +913,14 @@ class BaseClient(object):
         netloc = "%s:%d" % (self.host, self.port)
 
         if isinstance(params, dict):
-            for (key, value) in list(params.items()):
+            query_params = {}
+            for (key, value) in six.iteritems(params):
                 if value is None:
-                    del params[key]
                     continue
                 if not isinstance(value, six.string_types):
                     value = str(value)
-                params[key] = encodeutils.safe_encode(value)
-            query = urlparse.urlencode(params)
+                query_params[key] = encodeutils.safe_encode(value)
+            query = urlparse.urlencode(query_params)
         else:
             query = None
 
@@ -451,7 +982,12 @@ class BaseClient(object):
             if 'x-auth-token' not in headers and self.auth_token:
                 headers['x-auth-token'] = self.auth_token
 
-            c = connection_type(url.hostname, url.port, **self.connect_kwargs)
+            key = self._pool_key(url)
+            c = self.connection_pool.get(key)
+            reused = c is not None
+            if not reused:
+                c = connection_type(url.hostname, url.port,
+                                    **self.connect_kwargs)
 
             def _pushing(method):
                 return method.lower() in ('post', 'put')
@@ -468,84 +1004,151 @@ class BaseClient(object):
                     # iterator has done the heavy lifting
                     pass
 
-            def _chunkbody(connection, iter):
-                connection.putheader('Transfer-Encoding', 'chunked')
-                connection.endheaders()
-                for chunk in iter:
-                    connection.send('%x\r\n%s\r\n' % (len(chunk), chunk))
-                connection.send('0\r\n\r\n')
-
-            # Do a simple request or a chunked request, depending
-            # on whether the body param is file-like or iterable and
-            # the method is PUT or POST
-            #
-            if not _pushing(method) or _simple(body):
-                # Simple request...
-                c.request(method, path, body, headers)
-            elif _filelike(body) or self._iterable(body):
-                c.putrequest(method, path)
-
-                use_sendfile = self._sendable(body)
-
-                # According to HTTP/1.1, Content-Length and Transfer-Encoding
-                # conflict.
-                for header, value in headers.items():
-                    if use_sendfile or header.lower() != 'content-length':
-                        c.putheader(header, str(value))
-
-                iter = utils.chunkreadable(body)
-
-                if use_sendfile:
-                    # send actual file without copying into userspace
-                    _sendbody(c, iter)
+            def _send(c):
+                # Do a simple request or a chunked request, depending
+                # on whether the body param is file-like or iterable and
+                # the method is PUT or POST
+                #
+                if not _pushing(method) or _simple(body):
+                    # Simple request...
+                    c.request(method, path, body, headers)
+                elif _filelike(body) or self._iterable(body):
+                    c.putrequest(method, path)
+
+                    use_sendfile = self._sendable(body)
+
+                    # According to HTTP/1.1, Content-Length and
+                    # Transfer-Encoding conflict.
+                    for header, value in headers.items():
+                        if use_sendfile or header.lower() != 'content-length':
+                            c.putheader(header, str(value))
+
+                    if use_sendfile:
+                        # send actual file without copying into userspace
+                        _sendbody(c, utils.chunkreadable(body))
+                    else:
+                        # otherwise iterate and chunk
+                        self._send_chunked(c, body)
                 else:
-                    # otherwise iterate and chunk
-                    _chunkbody(c, iter)
-            else:
-                raise TypeError('Unsupported image type: %s' % body.__class__)
+                    raise TypeError('Unsupported image type: %s' %
+                                    body.__class__)
 
-            res = c.getresponse()
+                return c.getresponse()
 
-            def _retry(res):
-                return res.getheader('Retry-After')
-
-            def read_body(res):
-                body = res.read()
-                if six.PY3:
-                    body = body.decode('utf-8')
-                return body
+            try:
+                res = _send(c)
+            except (socket.error, http_client.BadStatusLine):
+                c.close()
+                # NOTE: The server may close an idle connection just as it
+                # is reused. Only bodies which can be sent again are retried.
+                if not reused or (_pushing(method) and not _simple(body)):
+                    raise
+                c = connection_type(url.hostname, url.port,
+                                    **self.connect_kwargs)
+                res = _send(c)
+            res = PooledResponse(res, self.connection_pool, key, c)
 
             status_code = self.get_status_code(res)
             if status_code in self.OK_RESPONSE_CODES:
                 return res
-            elif status_code in self.REDIRECT_RESPONSE_CODES:
-                raise exception.RedirectException(res.getheader('Location'))
-            elif status_code == http_client.UNAUTHORIZED:
-                raise exception.NotAuthenticated(read_body(res))
-            elif status_code == http_client.FORBIDDEN:
-                raise exception.Forbidden(read_body(res))
-            elif status_code == http_client.NOT_FOUND:
-                raise exception.NotFound(read_body(res))
-            elif status_code == http_client.CONFLICT:
-                raise exception.Duplicate(read_body(res))
-            elif status_code == http_client.BAD_REQUEST:
-                raise exception.Invalid(read_body(res))
-            elif status_code == http_client.MULTIPLE_CHOICES:
-                raise exception.MultipleChoices(body=read_body(res))
-            elif status_code == http_client.REQUEST_ENTITY_TOO_LARGE:
-                raise exception.LimitExceeded(retry=_retry(res),
-                                              body=read_body(res))
-            elif status_code == http_client.INTERNAL_SERVER_ERROR:
-                raise exception.ServerError()
-            elif status_code == http_client.SERVICE_UNAVAILABLE:
-                raise exception.ServiceUnavailable(retry=_retry(res))
-            else:
-                raise exception.UnexpectedStatus(status=status_code,
-                                                 body=read_body(res))
+            try:
+                self._raise_for_status(res, status_code)
+            finally:
+                # NOTE: Drops the connection unless the body was read.
+                res.close()
 
         except (socket.error, IOError) as e:
             raise exception.ClientConnectionError(e)
 
+    def _raise_for_status(self, res, status_code):
+        """
+        Raises the exception matching the status code of an unsuccessful
+        response.
+        """
+        def _retry(res):
+            return res.getheader('Retry-After')
+
+        def read_body(res):
+            body = res.read()
+            if six.PY3:
+                body = body.decode('utf-8')
+            return body
+
+        if status_code in self.REDIRECT_RESPONSE_CODES:
+            # NOTE: Read the body so that the connection can be
+            # reused if the server redirects to itself.
+            res.read()
+            raise exception.RedirectException(res.getheader('Location'))
+        elif status_code == http_client.UNAUTHORIZED:
+            raise exception.NotAuthenticated(read_body(res))
+        elif status_code == http_client.FORBIDDEN:
+            raise exception.Forbidden(read_body(res))
+        elif status_code == http_client.NOT_FOUND:
+            raise exception.NotFound(read_body(res))
+        elif status_code == http_client.CONFLICT:
+            raise exception.Duplicate(read_body(res))
+        elif status_code == http_client.BAD_REQUEST:
+            raise exception.Invalid(read_body(res))
+        elif status_code == http_client.MULTIPLE_CHOICES:
+            raise exception.MultipleChoices(body=read_body(res))
+        elif status_code == http_client.REQUEST_ENTITY_TOO_LARGE:
+            raise exception.LimitExceeded(retry=_retry(res),
+                                          body=read_body(res))
+        elif status_code == http_client.INTERNAL_SERVER_ERROR:
+            raise exception.ServerError()
+        elif status_code == http_client.SERVICE_UNAVAILABLE:
+            raise exception.ServiceUnavailable(retry=_retry(res))
+        else:
+            raise exception.UnexpectedStatus(status=status_code,
+                                             body=read_body(res))
+
+    def _send_chunked(self, connection, body):
+        """
+        Sends a body with the chunked transfer encoding.
+
+        Chunks are framed without copying them: the chunks of file-like
+        bodies are read into a reused buffer which has room for their
+        framing, and the chunks of iterables are sent along with their
+        framing through sendmsg() when the socket supports it.
+
+        :param connection: the connection the headers were put on
+        :param body: file-like or iterable body
+        """
+        connection.putheader('Transfer-Encoding', 'chunked')
+        connection.endheaders()
+        if hasattr(body, 'readinto'):
+            self._send_read_chunks(connection, body)
+        else:
+            sock = connection.sock
+            if self.use_ssl or not hasattr(sock, 'sendmsg'):
+                sock = None
+            for chunk in utils.chunkreadable(body):
+                if not chunk:
+                    # NOTE: An empty chunk would end the body.
+                    continue
+                header = ('%x\r\n' % len(chunk)).encode('ascii')
+                if sock is not None:
+                    _sendmsg_all(sock, [header, chunk, b'\r\n'])
+                else:
+                    connection.send(header)
+                    connection.send(chunk)
+                    connection.send(b'\r\n')
+        connection.send(b'0\r\n\r\n')
+
+    @staticmethod
+    def _send_read_chunks(connection, body):
+        head = _CHUNK_HEADER_SIZE
+        view = memoryview(bytearray(head + CHUNKSIZE + 2))
+        while True:
+            size = body.readinto(view[head:head + CHUNKSIZE])
+            if not size:
+                break
+            header = ('%x\r\n' % size).encode('ascii')
+            start = head - len(header)
+            view[start:head] = header
+            view[head + size:head + size + 2] = b'\r\n'
+            connection.send(view[start:head + size + 2])
+
     def _seekable(self, body):
         # pipes are not seekable, avoids sendfile() failure on e.g.
         #   cat /path/to/image | clictest add ...
@@ -60,6 +60,104 @@ class ClictestException(Exception):
         # __unicode__, it should return unicode always.
         return six.text_type(self.msg)
 
+
+class BodyNotReplayable(ClictestException):
+    message = _("The request body cannot be sent again: %(reason)s.")
+
+
+class ChecksumMismatch(ClictestException):
+    message = _("Checksum of %(resource)s is %(actual)s, expected "
+                "%(expected)s.")
+
+
+class ClientConnectionError(ClictestException):
+    message = _("There was an error connecting to a server")
+
+
+class Duplicate(ClictestException):
+    message = _("An object with the same identifier already exists.")
+
+
+class Forbidden(ClictestException):
+    message = _("You are not authorized to complete %(action)s action.")
+
+
+class Invalid(ClictestException):
+    message = _("Data supplied was not valid.")
+
+
+class InvalidPropertyProtectionConfiguration(Invalid):
+    message = _("Invalid configuration in property protection file.")
+
+
+class InvalidRedirect(ClictestException):
+    message = _("Received invalid HTTP redirect.")
+
+
+class LimitExceeded(ClictestException):
+    message = _("The request returned a 413 Request Entity Too Large. This "
+                "generally means that rate limiting or a quota threshold was "
+                "breached.\n\nThe response body:\n%(body)s")
+
+    def __init__(self, *args, **kwargs):
+        self.retry_after = (int(kwargs['retry']) if kwargs.get('retry')
+                            else None)
+        super(LimitExceeded, self).__init__(*args, **kwargs)
+
+
+class MaxRedirectsExceeded(ClictestException):
+    message = _("Maximum redirects (%(redirects)s) was exceeded.")
+
+
+class MultipleChoices(ClictestException):
+    message = _("The request returned a 302 Multiple Choices. This generally "
+                "means that you have not included a version indicator in a "
+                "request URI.\n\nThe body of response returned:\n%(body)s")
+
+
+class NoServiceEndpoint(ClictestException):
+    message = _("Response from Keystone does not contain a Clictest "
+                "endpoint.")
+
+
+class NotAuthenticated(ClictestException):
+    message = _("You are not authenticated.")
+
+
+class NotFound(ClictestException):
+    message = _("An object with the specified identifier was not found.")
+
+
+class RegionAmbiguity(ClictestException):
+    message = _("Multiple 'image' service matches for region %(region)s. This "
+                "generally means that a region is required and you have not "
+                "supplied one.")
+
+
+class RPCError(ClictestException):
+    message = _("%(cls)s exception was raised in the last rpc call: %(val)s")
+
+
+class ServerError(ClictestException):
+    message = _("The request returned 500 Internal Server Error.")
+
+
+class ServiceUnavailable(ClictestException):
+    message = _("The request returned 503 Service Unavailable. This "
+                "generally occurs on service overload or other transient "
+                "outage.")
+
+    def __init__(self, *args, **kwargs):
+        self.retry_after = (int(kwargs['retry']) if kwargs.get('retry')
+                            else None)
+        super(ServiceUnavailable, self).__init__(*args, **kwargs)
+
+
+class UnexpectedStatus(ClictestException):
+    message = _("The request returned an unexpected status: %(status)s."
+                "\n\nThe response body:\n%(body)s")
+
+
 class WorkerCreationFailure(ClictestException):
     message = _("Server worker creation failed: %(reason)s.")
 
@@ -0,0 +1,119 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+JSON engines used to (de)serialize the bodies of the API.
+
+The ``stdlib`` engine goes through oslo.serialization and the json module.
+The ``orjson`` engine, available when orjson is installed, encodes and
+decodes in C; it formats dates with the `default` hook given by the caller,
+so that they are rendered exactly as by the ``stdlib`` engine, and it falls
+back to the ``stdlib`` engine for the documents it cannot handle, such as
+integers of more than 64 bits.
+"""
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_serialization import jsonutils
+
+from clictest.i18n import _, _LW
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LOG = logging.getLogger(__name__)
+
+json_engine_opts = [
+    cfg.StrOpt('json_engine', default='stdlib',
+               choices=('auto', 'stdlib', 'orjson'),
+               help=_('Library used to serialize and deserialize the JSON '
+                      'bodies of the API. "stdlib" uses the json module of '
+                      'the standard library, "orjson" uses orjson, and '
+                      '"auto" uses orjson when it is installed and the '
+                      'standard library otherwise. Unlike the standard '
+                      'library, orjson does not escape non-ASCII characters '
+                      'and does not put spaces after separators.')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(json_engine_opts)
+
+_ENGINES = {}
+
+
+class StdlibEngine(object):
+
+    name = 'stdlib'
+
+    def dumps(self, obj, default):
+        """Serialize `obj` to UTF-8 encoded JSON.
+
+        :param default: called with the objects which cannot be serialized
+                        as they are, and returns a serializable form of them
+        """
+        return jsonutils.dump_as_bytes(obj, default=default)
+
+    def loads(self, data, object_hook=None):
+        if object_hook is None:
+            return jsonutils.loads(data)
+        return jsonutils.loads(data, object_hook=object_hook)
+
+
+class OrjsonEngine(object):
+
+    name = 'orjson'
+
+    def __init__(self):
+        self.option = (orjson.OPT_NON_STR_KEYS |
+                       orjson.OPT_PASSTHROUGH_DATETIME)
+        self.fallback = StdlibEngine()
+
+    def dumps(self, obj, default):
+        try:
+            return orjson.dumps(obj, default=default, option=self.option)
+        except orjson.JSONEncodeError:
+            # NOTE: The standard library raises the same error when the
+            # document really is not serializable.
+            return self.fallback.dumps(obj, default)
+
+    def loads(self, data, object_hook=None):
+        if object_hook is not None:
+            return self.fallback.loads(data, object_hook=object_hook)
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            return self.fallback.loads(data)
+
+
+def _load_engine(name):
+    if name == 'auto':
+        return OrjsonEngine() if orjson is not None else StdlibEngine()
+    if name == 'orjson':
+        if orjson is not None:
+            return OrjsonEngine()
+        LOG.warn(_LW("The orjson JSON engine is configured but orjson is "
+                     "not installed, using the standard library."))
+    return StdlibEngine()
+
+
+def get_engine():
+    """Return the configured JSON engine."""
+    name = CONF.json_engine
+    engine = _ENGINES.get(name)
+    if engine is None:
+        engine = _ENGINES[name] = _load_engine(name)
+    return engine
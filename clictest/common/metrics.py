@@ -0,0 +1,290 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Metrics are cheap to record: histograms are pre-bucketed and every labelled
+child is created once, the first time its label value is seen, so recording
+a sample is a bisect and two additions. Metrics live in the memory of each
+worker; the ``worker`` label identifying the process is only added when they
+are rendered.
+"""
+
+import bisect
+import gc
+import os
+
+import six
+
+from clictest.common import stats
+from clictest.common import timeutils
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = stats.LATENCY_BUCKETS
+
+GC_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5)
+
+
+def _escape(value):
+    return (six.text_type(value).replace('\\', r'\\')
+            .replace('\n', r'\n').replace('"', r'\"'))
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+
+def _labels(names, values):
+    names = ('worker',) + names
+    values = (str(os.getpid()),) + values
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value))
+                             for name, value in zip(names, values))
+
+
+class Registry(object):
+    """Collection of the metrics rendered by the metrics endpoint."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector):
+        """Register a callable returning extra exposition lines on render."""
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            metric.render(lines)
+        for collector in self._collectors:
+            lines.extend(collector())
+        lines.append('')
+        return '\n'.join(lines).encode('utf-8')
+
+
+REGISTRY = Registry()
+
+
+class _CounterChild(object):
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _HistogramChild(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class _Metric(object):
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(),
+                 registry=REGISTRY):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._default = self._children[()] = self._new_child()
+        registry.register(self)
+
+    def _new_child(self):
+        raise NotImplementedError()
+
+    def labels(self, *values):
+        """Return the child for the given label values.
+
+        Callers on a hot path should keep the returned child around rather
+        than looking it up for every sample.
+        """
+        child = self._children.get(values)
+        if child is None:
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self, lines):
+        lines.append('# HELP %s %s' % (self.name, self.documentation))
+        lines.append('# TYPE %s %s' % (self.name, self.kind))
+        for values, child in sorted(self._children.items()):
+            self._render_child(lines, values, child)
+
+    def _render_child(self, lines, values, child):
+        raise NotImplementedError()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.value += amount
+
+    def _render_child(self, lines, values, child):
+        lines.append('%s%s %s' % (self.name,
+                                  _labels(self.labelnames, values),
+                                  _format_value(child.value)))
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS, registry=REGISTRY):
+        self.buckets = tuple(sorted(buckets))
+        super(Histogram, self).__init__(name, documentation, labelnames,
+                                        registry=registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _render_child(self, lines, values, child):
+        names = self.labelnames + ('le',)
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), child.counts):
+            cumulative += count
+            lines.append('%s_bucket%s %d' % (
+                self.name, _labels(names, values + (bound,)), cumulative))
+        labels = _labels(self.labelnames, values)
+        lines.append('%s_sum%s %s' % (self.name, labels, repr(child.sum)))
+        lines.append('%s_count%s %d' % (self.name, labels, cumulative))
+
+
+class Gauge(_Metric):
+    """A gauge whose value is computed by a callback at render time.
+
+    The callback returns either a number or, for labelled gauges, a mapping
+    of label value tuples to numbers.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=(),
+                 registry=REGISTRY):
+        self.callback = callback
+        super(Gauge, self).__init__(name, documentation, labelnames,
+                                    registry=registry)
+
+    def _new_child(self):
+        return None
+
+    def render(self, lines):
+        lines.append('# HELP %s %s' % (self.name, self.documentation))
+        lines.append('# TYPE %s %s' % (self.name, self.kind))
+        value = self.callback()
+        if not self.labelnames:
+            value = {(): value}
+        for values, sample in sorted(value.items()):
+            lines.append('%s%s %s' % (self.name,
+                                      _labels(self.labelnames, values),
+                                      _format_value(sample)))
+
+
+REQUEST_DURATION = Histogram(
+    'clictest_request_duration_seconds',
+    'Duration of the API requests served by this worker, per route.',
+    labelnames=('route',))
+
+UPSTREAM_DURATION = Histogram(
+    'clictest_upstream_request_duration_seconds',
+    'Duration of the calls made by this worker to upstream services.',
+    labelnames=('upstream',))
+
+GC_PAUSE = Histogram(
+    'clictest_gc_pause_seconds',
+    'Duration of the garbage collector runs in this worker.',
+    labelnames=('generation',), buckets=GC_BUCKETS)
+
+_GC_PAUSES = [GC_PAUSE.labels(str(generation)) for generation in range(3)]
+
+_gc_start = [None]
+
+
+def _gc_callback(phase, info):
+    if phase == 'start':
+        _gc_start[0] = timeutils.now()
+        return
+    start = _gc_start[0]
+    if start is not None:
+        _gc_start[0] = None
+        _GC_PAUSES[info['generation']].observe(timeutils.now() - start)
+
+
+def install_gc_hooks():
+    """Time garbage collector runs, where the interpreter allows it."""
+    callbacks = getattr(gc, 'callbacks', None)
+    if callbacks is not None and _gc_callback not in callbacks:
+        callbacks.append(_gc_callback)
+
+
+def render_worker_stats(segment):
+    """Render the statistics aggregated over all the workers.
+
+    :param segment: the shared `clictest.common.stats.StatsSegment`
+    """
+    totals = segment.aggregate()
+    lines = [
+        '# HELP clictest_workers Number of live API workers.',
+        '# TYPE clictest_workers gauge',
+        'clictest_workers %d' % totals['workers'],
+        '# HELP clictest_http_requests_total Requests received by all '
+        'the API workers.',
+        '# TYPE clictest_http_requests_total counter',
+        'clictest_http_requests_total %d' % totals['requests'],
+        '# HELP clictest_http_requests_in_flight Requests being served by '
+        'all the API workers.',
+        '# TYPE clictest_http_requests_in_flight gauge',
+        'clictest_http_requests_in_flight %d' % totals['in_flight'],
+        '# HELP clictest_http_responses_total Responses sent by all the API '
+        'workers, per status class.',
+        '# TYPE clictest_http_responses_total counter',
+    ]
+    for status_class in stats.STATUS_CLASSES:
+        lines.append('clictest_http_responses_total{class="%s"} %d' %
+                     (status_class, totals['responses'][status_class]))
+    lines.extend([
+        '# HELP clictest_http_request_duration_seconds Duration of the '
+        'requests served by all the API workers.',
+        '# TYPE clictest_http_request_duration_seconds histogram',
+    ])
+    for bound, count in totals['latency_buckets']:
+        lines.append('clictest_http_request_duration_seconds_bucket'
+                     '{le="%s"} %d' % (bound, count))
+    lines.append('clictest_http_request_duration_seconds_sum %s' %
+                 repr(totals['latency_sum']))
+    lines.append('clictest_http_request_duration_seconds_count %d' %
+                 totals['requests'])
+    return lines
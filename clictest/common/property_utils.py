@@ -12,8 +12,11 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
 import re
+import weakref
 
+import eventlet
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_policy import policy
@@ -21,9 +24,10 @@ from six.moves import configparser
 
 import clictest.api.policy
 from clictest.common import exception
-from clictest.i18n import _, _LE, _LW
+from clictest.common import utils
+from clictest.common import wsgi
+from clictest.i18n import _, _LE, _LI, _LW
 
-CONFIG = configparser.SafeConfigParser()
 LOG = logging.getLogger(__name__)
 
 property_opts = [
@@ -40,6 +44,16 @@ property_opts = [
                choices=('roles', 'policies'),
                help=_('This config value indicates whether "roles" or '
                       '"policies" are used in the property protection file.')),
+    cfg.IntOpt('property_protection_cache_size', default=1024, min=0,
+               help=_('Maximum number of property names, and of property '
+                      'protection decisions, remembered by the property '
+                      'protection rules. Set to 0 to disable the cache.')),
+    cfg.IntOpt('property_protection_reload_interval', default=10, min=0,
+               help=_('Interval, in seconds, at which every worker checks '
+                      'whether the property protection file changed and, '
+                      'if so, loads the new rules. The rules in use are '
+                      'replaced at once and only if the new file is valid. '
+                      'Set to 0 to only load the file at startup.')),
 ]
 
 CONF = cfg.CONF
@@ -50,6 +64,19 @@ CONF.register_opts(property_opts)
 # created
 InvalidPropProtectConf = exception.InvalidPropertyProtectionConfiguration
 
+_REGEX_SPECIAL = frozenset('.^$*+?{}[]\\|()')
+
+# NOTE: Rules using back references or global inline flags change meaning
+# once combined with other rules.
+_NOT_COMBINABLE = re.compile(r'\\[1-9]|\(\?P=|\(\?\(|\(\?[aiLmsux]+\)')
+
+_MISSING = object()
+
+# Rules whose property protection file is watched, and the green thread
+# watching them in this worker.
+_WATCHED = weakref.WeakSet()
+_watcher = None
+
 
 def is_property_protection_enabled():
     if CONF.property_protection_file:
@@ -57,21 +84,188 @@ def is_property_protection_enabled():
     return False
 
 
+def _literal_prefix(rule_exp):
+    """Return the literal prefix required by a rule anchored at the start.
+
+    :returns: the prefix, empty when the rule does not require one
+    """
+    pattern = rule_exp.pattern
+    if (not pattern.startswith('^') or '|' in pattern or
+            rule_exp.flags & re.IGNORECASE):
+        return ''
+    prefix = []
+    for char in pattern[1:]:
+        if char in _REGEX_SPECIAL:
+            if char in '*?{':
+                # The last character is optional
+                prefix = prefix[:-1]
+            break
+        prefix.append(char)
+    return ''.join(prefix)
+
+
+def start_watcher():
+    """Watch the property protection files of the rules from this worker.
+
+    A single green thread reloads the rules of every live PropertyRules,
+    rules which are no longer referenced being dropped from the watch.
+    """
+    global _watcher
+    interval = CONF.property_protection_reload_interval
+    if interval and _watcher is None:
+        _watcher = eventlet.spawn(_watch, interval)
+
+
+def _watch(interval):
+    while True:
+        eventlet.sleep(interval)
+        for rules in list(_WATCHED):
+            try:
+                rules.reload_if_changed()
+            except Exception:
+                LOG.exception(_LE("Unable to reload the property protection "
+                                  "rules"))
+
+
+wsgi.on_worker_start(start_watcher)
+
+
+def _file_signature(path):
+    """Return what identifies a version of a file, or None if unreadable."""
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return stat.st_mtime, stat.st_size, stat.st_ino
+
+
+class _RuleSnapshot(object):
+    """A loaded set of property protection rules, along with its index.
+
+    A snapshot is never modified once published, except for the results it
+    remembers, so that checks always see a complete rule set.
+
+    The rules are tried in order and the first one found in the property
+    name applies. They are combined into a single expression made of one
+    lookahead per rule, tried in the same order, so that the applying rule
+    is found in one pass. Rules which cannot be combined are tried one by one
+    instead, skipping the ones whose literal prefix does not match the
+    property name.
+    """
+
+    def __init__(self, rules, prop_exp_mapping, policy_rules,
+                 path=None, signature=None):
+        self.rules = rules
+        self.prop_exp_mapping = prop_exp_mapping
+        self.policy_rules = policy_rules
+        self.path = path
+        self.signature = signature
+        self.matches = utils.LRUCache(CONF.property_protection_cache_size)
+        self.decisions = utils.LRUCache(CONF.property_protection_cache_size)
+        self.prefixes = [_literal_prefix(rule_exp)
+                         for rule_exp, rule in rules]
+        self.combined = None
+        self.rule_groups = {}
+        if rules and not any(_NOT_COMBINABLE.search(rule_exp.pattern)
+                             for rule_exp, rule in rules):
+            self._combine()
+
+    def _combine(self):
+        alternatives = []
+        rule_groups = {}
+        for index, rule in enumerate(self.rules):
+            group = '_rule%d' % index
+            rule_groups[group] = rule
+            alternatives.append(r'(?=[\s\S]*?(?:%s))(?P<%s>)' %
+                                (rule[0].pattern, group))
+        try:
+            self.combined = re.compile('|'.join(alternatives))
+        except re.error as e:
+            LOG.debug("Property protection rules not combined: %s", e)
+        else:
+            self.rule_groups = rule_groups
+
+    def find_rule(self, property_name):
+        """Return the first rule matching the property, or None."""
+        found = self.matches.get(property_name, _MISSING)
+        if found is not _MISSING:
+            return found
+
+        name = str(property_name)
+        found = None
+        if self.combined is not None:
+            match = self.combined.match(name)
+            if match is not None:
+                found = self.rule_groups[match.lastgroup]
+        else:
+            for rule, prefix in zip(self.rules, self.prefixes):
+                if name.startswith(prefix) and rule[0].search(name):
+                    found = rule
+                    break
+        self.matches[property_name] = found
+        return found
+
+
 class PropertyRules(object):
 
     def __init__(self, policy_enforcer=None):
-        self.rules = []
-        self.prop_exp_mapping = {}
         self.policies = []
         self.policy_enforcer = policy_enforcer or clictest.api.policy.Enforcer()
         self.prop_prot_rule_format = CONF.property_protection_rule_format
         self.prop_prot_rule_format = self.prop_prot_rule_format.lower()
+        self._snapshot = None
+        self._failed_signature = None
         self._load_rules()
+        if CONF.property_protection_reload_interval:
+            _WATCHED.add(self)
+
+    def stop_watching(self):
+        """Stop reloading the rules when the file changes."""
+        _WATCHED.discard(self)
+
+    @property
+    def rules(self):
+        return self._snapshot.rules
+
+    @property
+    def prop_exp_mapping(self):
+        return self._snapshot.prop_exp_mapping
 
     def _load_rules(self):
+        self._publish(self._read_rules())
+
+    def _publish(self, snapshot):
+        """Make a snapshot the rules in use.
+
+        The policy rules it refers to are added to the enforcer first, so
+        that they are defined by the time the snapshot can be used. They
+        are only added when they changed, as adding rules drops the
+        decisions cached by the enforcer.
+        """
+        current = self._snapshot
+        if snapshot.policy_rules and (
+                current is None or
+                snapshot.policy_rules != current.policy_rules):
+            self.policy_enforcer.add_rules(
+                policy.Rules.from_dict(snapshot.policy_rules))
+        self._snapshot = snapshot
+
+    def _read_rules(self):
+        """Read the property protection file into a new snapshot.
+
+        :raises: InvalidPropertyProtectionConfiguration if the file is
+                 missing or invalid
+        """
+        rules = []
+        prop_exp_mapping = {}
+        policy_rules = {}
+        # NOTE: A parser per load, so that sections removed from the file
+        # do not linger.
+        config = configparser.SafeConfigParser()
         try:
             conf_file = CONF.find_file(CONF.property_protection_file)
-            CONFIG.read(conf_file)
+            signature = _file_signature(conf_file)
+            config.read(conf_file)
         except Exception as e:
             msg = (_LE("Couldn't find property protection file %(file)s: "
                        "%(error)s.") % {'file': CONF.property_protection_file,
@@ -88,13 +282,13 @@ class PropertyRules(object):
             raise InvalidPropProtectConf()
 
         operations = ['create', 'read', 'update', 'delete']
-        properties = CONFIG.sections()
+        properties = config.sections()
         for property_exp in properties:
             property_dict = {}
             compiled_rule = self._compile_rule(property_exp)
 
             for operation in operations:
-                permissions = CONFIG.get(property_exp, operation)
+                permissions = config.get(property_exp, operation)
                 if permissions:
                     if self.prop_prot_rule_format == 'policies':
                         if ',' in permissions:
@@ -104,9 +298,9 @@ class PropertyRules(object):
                                     "combined in the policy file"),
                                 permissions)
                             raise InvalidPropProtectConf()
-                        self.prop_exp_mapping[compiled_rule] = property_exp
-                        self._add_policy_rules(property_exp, operation,
-                                               permissions)
+                        prop_exp_mapping[compiled_rule] = property_exp
+                        self._add_policy_rules(policy_rules, property_exp,
+                                               operation, permissions)
                         permissions = [permissions]
                     else:
                         permissions = [permission.strip() for permission in
@@ -131,7 +325,36 @@ class PropertyRules(object):
                         {'operation': operation,
                          'rule': property_exp})
 
-            self.rules.append((compiled_rule, property_dict))
+            rules.append((compiled_rule, property_dict))
+
+        return _RuleSnapshot(rules, prop_exp_mapping, policy_rules,
+                             path=conf_file, signature=signature)
+
+    def reload_if_changed(self):
+        """Load the property protection file again if it changed.
+
+        The new rules replace the ones in use in a single assignment, and
+        only if they are valid.
+
+        :returns: True if new rules are in use, False otherwise
+        """
+        current = self._snapshot
+        signature = _file_signature(current.path)
+        if signature in (current.signature, self._failed_signature):
+            return False
+        try:
+            snapshot = self._read_rules()
+        except InvalidPropProtectConf:
+            # NOTE: Only report a given version of the file once.
+            self._failed_signature = signature
+            LOG.error(_LE("Invalid property protection file %s, the "
+                          "previous rules are still in use."), current.path)
+            return False
+        self._failed_signature = None
+        self._publish(snapshot)
+        LOG.info(_LI("Property protection rules reloaded from %s"),
+                 snapshot.path)
+        return True
 
     def _compile_rule(self, rule):
         try:
@@ -143,8 +366,8 @@ class PropertyRules(object):
             LOG.error(msg)
             raise InvalidPropProtectConf()
 
-    def _add_policy_rules(self, property_exp, action, rule):
-        """Add policy rules to the policy enforcer.
+    def _add_policy_rules(self, policy_rules, property_exp, action, rule):
+        """Add policy rules for the policy enforcer to a mapping.
 
         For example, if the file listed as property_protection_file has:
         [prop_a]
@@ -156,10 +379,7 @@ class PropertyRules(object):
         """
         rule = "rule:%s" % rule
         rule_name = "%s:%s" % (property_exp, action)
-        rule_dict = policy.Rules.from_dict({
-            rule_name: rule
-        })
-        self.policy_enforcer.add_rules(rule_dict)
+        policy_rules[rule_name] = rule
 
     def _check_policy(self, property_exp, action, context):
         try:
@@ -170,19 +390,37 @@ class PropertyRules(object):
         return True
 
     def check_property_rules(self, property_name, action, context):
-        roles = context.roles
-        if not self.rules:
+        # NOTE: The snapshot is only read once, so that a check is never
+        # made against two versions of the rules.
+        snapshot = self._snapshot
+        if not snapshot.rules:
             return True
 
         if action not in ['create', 'read', 'update', 'delete']:
             return False
 
-        for rule_exp, rule in self.rules:
-            if rule_exp.search(str(property_name)):
-                break
-        else:  # no matching rules
+        # NOTE: With policies, the decision depends on more than the roles,
+        # and is cached by the policy enforcer when it does not.
+        if self.prop_prot_rule_format == 'policies':
+            return self._check_property_rules(snapshot, property_name,
+                                              action, context)
+
+        key = (property_name, action, frozenset(context.roles))
+        allowed = snapshot.decisions.get(key)
+        if allowed is None:
+            allowed = self._check_property_rules(snapshot, property_name,
+                                                 action, context)
+            snapshot.decisions[key] = allowed
+        return allowed
+
+    def _check_property_rules(self, snapshot, property_name, action,
+                              context):
+        roles = context.roles
+        found = snapshot.find_rule(property_name)
+        if found is None:  # no matching rules
             return False
 
+        rule_exp, rule = found
         rule_roles = rule.get(action)
         if rule_roles:
             if '!' in rule_roles:
@@ -190,7 +428,7 @@ class PropertyRules(object):
             elif '@' in rule_roles:
                 return True
             if self.prop_prot_rule_format == 'policies':
-                prop_exp_key = self.prop_exp_mapping[rule_exp]
+                prop_exp_key = snapshot.prop_exp_mapping[rule_exp]
                 return self._check_policy(prop_exp_key, action,
                                           context)
             if set(roles).intersection(set([role.lower() for role
@@ -17,8 +17,13 @@
 RPC Controller
 """
 import datetime
+import itertools
+import sys
 import traceback
 
+import eventlet
+from eventlet import event
+from eventlet import queue
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import encodeutils
@@ -45,6 +50,11 @@ rpc_opts = [
                          ],
                 help='Modules of exceptions that are permitted to be recreated'
                      ' upon receiving exception data from an rpc call.'),
+    cfg.IntOpt('rpc_concurrency', default=10, min=1,
+               help=_('Maximum number of commands of an RPC bulk request '
+                      'executed concurrently. Only the commands flagged as '
+                      'independent, or all the commands of the requests '
+                      'flagged as parallel, are executed concurrently.')),
 ]
 
 CONF = cfg.CONF
@@ -96,6 +106,21 @@ class Controller(object):
     The controller is capable of processing more than one command
     per request and will always return a list of results.
 
+    Commands are executed one after another, unless they are flagged
+    with ``'independent': True``, in which case consecutive independent
+    commands are executed concurrently, or unless the whole request is
+    flagged as parallel:
+
+    .. code-block:: json
+
+        {
+            'parallel': True,
+            'commands': [{...}, {...}]
+        }
+
+    At most ``rpc_concurrency`` commands of a request run at the same
+    time, and results are returned in the order of the commands.
+
     :param bool raise_exc: Specifies whether to raise
         exceptions instead of "serializing" them.
 
@@ -143,6 +168,14 @@ class Controller(object):
         Executes the command
         """
 
+        parallel = False
+        if isinstance(body, dict):
+            parallel = body.get("parallel", False)
+            body = body.get("commands")
+            if not isinstance(parallel, bool):
+                msg = _("parallel must be a boolean")
+                raise exc.HTTPBadRequest(explanation=msg)
+
         if not isinstance(body, list):
             msg = _("Request must be a list of commands")
             raise exc.HTTPBadRequest(explanation=msg)
@@ -155,7 +188,8 @@ class Controller(object):
             command, kwargs = cmd.get("command"), cmd.get("kwargs")
 
             if (not command or not isinstance(command, six.string_types) or
-                    (kwargs and not isinstance(kwargs, dict))):
+                    (kwargs and not isinstance(kwargs, dict)) or
+                    not isinstance(cmd.get("independent", False), bool)):
                 msg = _("Wrong command structure: %s") % (str(cmd))
                 raise exc.HTTPBadRequest(explanation=msg)
 
@@ -173,41 +207,117 @@ class Controller(object):
         # be intended to be executed sequentially, that for,
         # lets first verify they're all valid before executing
         # them.
-        commands = filter(validate, body)
+        commands = list(filter(validate, body))
 
         results = []
-        for cmd in commands:
-            # kwargs is not required
-            command, kwargs = cmd["command"], cmd.get("kwargs", {})
-            method = self._registered[command]
+        for batch in self._batches(commands, parallel):
+            if len(batch) == 1:
+                results.append(self._execute(req, batch[0]))
+                continue
+            results.extend(self._execute_concurrently(req, batch))
+        return results
+
+    def _execute_concurrently(self, req, commands):
+        """
+        Execute commands concurrently, at most ``rpc_concurrency`` at a
+        time, and return their results in order.
+
+        When a command raises, which only happens with raise_exc, the
+        commands still running are killed and the others not started.
+        """
+        results = [None] * len(commands)
+        finished = queue.LightQueue()
+        running = {}
+        pending = iter(enumerate(commands))
+
+        def _run(index, cmd):
             try:
-                result = method(req.context, **kwargs)
-            except Exception as e:
-                if self.raise_exc:
-                    raise
-
-                cls, val = e.__class__, encodeutils.exception_to_unicode(e)
-                msg = (_LE("RPC Call Error: %(val)s\n%(tb)s") %
-                       dict(val=val, tb=traceback.format_exc()))
-                LOG.error(msg)
-
-                # NOTE(flaper87): Don't propagate all exceptions
-                # but the ones allowed by the user.
-                module = cls.__module__
-                if module not in CONF.allowed_rpc_exception_modules:
-                    cls = exception.RPCError
-                    val = encodeutils.exception_to_unicode(
-                        exception.RPCError(cls=cls, val=val))
-
-                cls_path = "%s.%s" % (cls.__module__, cls.__name__)
-                result = {"_error": {"cls": cls_path, "val": val}}
-            results.append(result)
+                finished.put((index, self._execute(req, cmd), None))
+            except Exception:
+                finished.put((index, None, sys.exc_info()))
+
+        def _start(count):
+            for index, cmd in itertools.islice(pending, count):
+                running[index] = eventlet.spawn(_run, index, cmd)
+
+        _start(CONF.rpc_concurrency)
+        while running:
+            index, result, exc_info = finished.get()
+            del running[index]
+            if exc_info is not None:
+                for thread in running.values():
+                    thread.kill()
+                six.reraise(*exc_info)
+            results[index] = result
+            _start(1)
         return results
 
+    @staticmethod
+    def _batches(commands, parallel):
+        """
+        Split the commands into the lists of commands which can be
+        executed concurrently, in order.
+        """
+        if parallel:
+            return [commands] if commands else []
+        batches = []
+        batch = []
+        for cmd in commands:
+            if not cmd.get("independent"):
+                if batch:
+                    batches.append(batch)
+                    batch = []
+                batches.append([cmd])
+            else:
+                batch.append(cmd)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def _execute(self, req, cmd):
+        # kwargs is not required
+        command, kwargs = cmd["command"], cmd.get("kwargs", {})
+        method = self._registered[command]
+        try:
+            return method(req.context, **kwargs)
+        except Exception as e:
+            if self.raise_exc:
+                raise
+
+            cls, val = e.__class__, encodeutils.exception_to_unicode(e)
+            msg = (_LE("RPC Call Error: %(val)s\n%(tb)s") %
+                   dict(val=val, tb=traceback.format_exc()))
+            LOG.error(msg)
+
+            # NOTE(flaper87): Don't propagate all exceptions
+            # but the ones allowed by the user.
+            module = cls.__module__
+            if module not in CONF.allowed_rpc_exception_modules:
+                cls = exception.RPCError
+                val = encodeutils.exception_to_unicode(
+                    exception.RPCError(cls=cls, val=val))
+
+            cls_path = "%s.%s" % (cls.__module__, cls.__name__)
+            return {"_error": {"cls": cls_path, "val": val}}
+
 
 class RPCClient(client.BaseClient):
+    """
+    Client of an RPC controller.
+
+    Remote methods are called as methods of the client. When created with
+    a ``batch_window`` in seconds, the calls issued by different
+    greenthreads within that window, or until ``batch_size`` calls are
+    pending, are sent together in a single parallel bulk request and each
+    caller waits for its own result.
+    """
 
     def __init__(self, *args, **kwargs):
+        self.batch_window = kwargs.pop("batch_window", None)
+        self.batch_size = kwargs.pop("batch_size", 50)
+        self._pending = []
+        self._flusher = None
+
         self._serializer = RPCJSONSerializer()
         self._deserializer = RPCJSONDeserializer()
 
@@ -216,7 +326,7 @@ class RPCClient(client.BaseClient):
         super(RPCClient, self).__init__(*args, **kwargs)
 
     @client.handle_unauthenticated
-    def bulk_request(self, commands):
+    def bulk_request(self, commands, parallel=False):
         """
         Execute multiple commands in a single request.
 
@@ -230,12 +340,21 @@ class RPCClient(client.BaseClient):
                 'kwargs': method_kwargs
             }
 
+        :param parallel: Whether the commands are independent and may
+            be executed concurrently by the server.
         """
-        body = self._serializer.to_json(commands)
+        if parallel:
+            commands = {'parallel': True, 'commands': commands}
         response = super(RPCClient, self).do_request('POST',
                                                      self.base_path,
-                                                     body)
-        return self._deserializer.from_json(response.read())
+                                                     self._dumps(commands))
+        return self._loads(response.read())
+
+    def _dumps(self, commands):
+        return self._serializer.to_json(commands)
+
+    def _loads(self, data):
+        return self._deserializer.from_json(data)
 
     def do_request(self, method, **kwargs):
         """
@@ -247,13 +366,23 @@ class RPCClient(client.BaseClient):
         :param kwargs: Dynamic parameters that will be
             passed to the remote method.
         """
-        content = self.bulk_request([{'command': method,
-                                      'kwargs': kwargs}])
+        command = {'command': method, 'kwargs': kwargs}
+        if self.batch_window is not None:
+            content = self._batched_request(command)
+        else:
+            content = self.bulk_request([command])
 
-        # NOTE(flaper87): Return the first result if
-        # a single command was executed.
-        content = content[0]
+            # NOTE(flaper87): Return the first result if
+            # a single command was executed.
+            content = content[0]
 
+        return self._check_result(content)
+
+    def _check_result(self, content):
+        """
+        Raise the error returned by a command, if any and if raise_exc is
+        True, or return the result of the command.
+        """
         # NOTE(flaper87): Check if content is an error
         # and re-raise it if raise_exc is True. Before
         # checking if content contains the '_error' key,
@@ -272,6 +401,48 @@ class RPCClient(client.BaseClient):
                 raise exception.RPCError(**error)
         return content
 
+    def _batched_request(self, command):
+        """
+        Queue a command for the next bulk request and wait for its result.
+        """
+        result = event.Event()
+        self._pending.append((command, result))
+        if len(self._pending) >= self.batch_size:
+            self._flush()
+        elif self._flusher is None:
+            self._flusher = eventlet.spawn_after(self.batch_window,
+                                                 self._flush)
+        return result.wait()
+
+    def _flush(self):
+        """
+        Send the pending commands and hand their results to the callers.
+        """
+        pending, self._pending = self._pending, []
+        flusher, self._flusher = self._flusher, None
+        if flusher is not None and flusher is not eventlet.getcurrent():
+            # NOTE: Cancelling switches to the hub, which lets other callers
+            # queue commands for the next bulk request.
+            flusher.cancel()
+        if not pending:
+            return
+
+        # NOTE: Commands of different callers do not depend on each other.
+        try:
+            results = self.bulk_request(
+                [command for command, result in pending], parallel=True)
+            if len(results) != len(pending):
+                raise exception.ClictestException(
+                    _('%(results)d results received for %(commands)d '
+                      'commands') % {'results': len(results),
+                                     'commands': len(pending)})
+        except Exception as e:
+            for command, result in pending:
+                result.send_exception(e)
+            return
+        for (command, result), content in zip(pending, results):
+            result.send(content)
+
     def __getattr__(self, item):
         """
         This method returns a method_proxy that
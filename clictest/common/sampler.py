@@ -0,0 +1,267 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Statistical sampling profiler for the API workers.
+
+Unlike osprofiler, which traces individual requests and needs a messaging
+transport, the sampler is meant to be switched on in production for a
+limited time. While it runs, a SIGPROF interval timer interrupts the worker
+every `interval` seconds of CPU time and the stack of the green thread being
+executed at that moment is recorded. Green threads waiting for I/O or
+sleeping are not executed, so their stacks are recorded separately, every
+`blocked_interval` seconds of wall clock time. When the session ends the
+aggregated stacks are written in the collapsed format understood by
+flamegraph.pl.
+
+A session is toggled by sending SIGUSR2 to a worker, or to the parent which
+forwards it to all its workers, or through the sampler admin filter.
+"""
+
+import gc
+import os
+import signal
+import tempfile
+import time
+
+import eventlet
+import eventlet.hubs
+import greenlet
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from clictest.common import timeutils
+from clictest.i18n import _, _LE, _LI
+
+LOG = logging.getLogger(__name__)
+
+sampler_opts = [
+    cfg.FloatOpt('interval', default=0.005, min=0.001,
+                 help=_('Interval, in seconds of CPU time, between two '
+                        'samples taken by the sampling profiler.')),
+    cfg.FloatOpt('blocked_interval', default=0.1, min=0,
+                 help=_('Interval, in seconds, between two samples of the '
+                        'green threads which are blocked, waiting for I/O or '
+                        'sleeping. Finding them walks the objects tracked by '
+                        'the garbage collector, which takes longer as the '
+                        'worker holds more objects. Set to 0 to only sample '
+                        'the running green thread.')),
+    cfg.IntOpt('duration', default=30, min=1,
+               help=_('Number of seconds a sampling session lasts before '
+                      'its results are written, unless stopped earlier.')),
+    cfg.StrOpt('output_dir',
+               help=_('Directory the collapsed stack files are written to. '
+                      'Defaults to the system temporary directory.')),
+    cfg.BoolOpt('enable_signal', default=True,
+                help=_('Toggle a sampling session when the process receives '
+                       'SIGUSR2. The parent process forwards the signal to '
+                       'all its workers.')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(sampler_opts, group='sampler')
+
+HUB_THREAD = 'hub'
+GREEN_THREAD = 'greenthread'
+BLOCKED_THREAD = 'blocked'
+
+_SAMPLER = None
+
+
+def _frame_name(code):
+    return '%s:%s:%d' % (code.co_filename, code.co_name, code.co_firstlineno)
+
+
+class Sampler(object):
+    """Samples the stack of the running green thread on SIGPROF."""
+
+    def __init__(self, interval, output_dir=None, blocked_interval=0):
+        self.interval = interval
+        self.blocked_interval = blocked_interval
+        self.output_dir = output_dir or tempfile.gettempdir()
+        self.stacks = {}
+        self.samples = 0
+        self.running = False
+        self.deadline = None
+        self.last_dump = None
+        self.session = 0
+        self._timer = None
+
+    def start(self, duration):
+        """Start a session lasting `duration` seconds.
+
+        :returns: False if a session is already running, True otherwise
+        """
+        if self.running:
+            return False
+        self.stacks = {}
+        self.samples = 0
+        self.deadline = timeutils.now() + duration
+        self.running = True
+        self.session += 1
+        signal.signal(signal.SIGPROF, self._sample)
+        # NOTE: Otherwise the system calls interrupted by the timer would
+        # fail with EINTR on Python 2.
+        signal.siginterrupt(signal.SIGPROF, False)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        # NOTE: The timer above counts CPU time, which an idle worker does
+        # not use, so the session ends on wall clock time.
+        self._timer = eventlet.spawn_after(duration, self._expire,
+                                           self.session)
+        if self.blocked_interval:
+            eventlet.spawn_n(self._sample_blocked, self.session)
+        LOG.info(_LI("Sampling profiler started for %d seconds"), duration)
+        return True
+
+    def stop(self):
+        """Stop the running session and write its results.
+
+        :returns: path of the file written, or None if nothing was running
+        """
+        if not self.running:
+            return None
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, signal.SIG_IGN)
+        self.running = False
+        timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
+        try:
+            self.last_dump = self.dump()
+        except (IOError, OSError) as e:
+            LOG.error(_LE("Unable to write sampling profiler results: %s"),
+                      e)
+            return None
+        LOG.info(_LI("Sampling profiler stopped after %(samples)d samples, "
+                     "results written to %(path)s"),
+                 {'samples': self.samples, 'path': self.last_dump})
+        return self.last_dump
+
+    def toggle(self, duration):
+        """Start a session, or stop the running one.
+
+        Safe to call from a signal handler: the session is started or
+        stopped by a green thread, since both log and stopping writes the
+        results.
+        """
+        if self.running:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            eventlet.spawn_n(self.stop)
+        else:
+            eventlet.spawn_n(self.start, duration)
+
+    def _expire(self, session):
+        if self.session == session:
+            self.stop()
+
+    def _sample(self, signum, frame):
+        current = greenlet.getcurrent()
+        if current is eventlet.hubs.get_hub().greenlet:
+            thread = HUB_THREAD
+        else:
+            thread = GREEN_THREAD
+        self._record(thread, frame)
+
+    def _record(self, thread, frame):
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        # NOTE: Code objects are kept as they are and only formatted when the
+        # results are written, so that sampling stays cheap.
+        key = (thread,) + tuple(reversed(codes))
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def _sample_blocked(self, session):
+        """Record the stacks of the suspended green threads of a session.
+
+        The hub and the green threads which are not started or finished are
+        left out, as is this one.
+        """
+        hub = eventlet.hubs.get_hub().greenlet
+        while True:
+            eventlet.sleep(self.blocked_interval)
+            if (not self.running or self.session != session or
+                    timeutils.now() >= self.deadline):
+                break
+            current = greenlet.getcurrent()
+            for obj in gc.get_objects():
+                if (isinstance(obj, greenlet.greenlet) and
+                        obj is not current and obj is not hub and
+                        obj.gr_frame is not None):
+                    self._record(BLOCKED_THREAD, obj.gr_frame)
+
+    def collapsed(self):
+        """Return the recorded stacks in the collapsed stack format."""
+        lines = []
+        for key, count in self.stacks.items():
+            frames = [key[0]] + [_frame_name(code) for code in key[1:]]
+            lines.append('%s %d' % (';'.join(frames), count))
+        lines.sort()
+        return lines
+
+    def dump(self):
+        path = os.path.join(self.output_dir, 'clictest-api-%d-%s.collapsed' %
+                            (os.getpid(), time.strftime('%Y%m%d%H%M%S')))
+        with open(path, 'w') as f:
+            for line in self.collapsed():
+                f.write(line + '\n')
+        return path
+
+    def status(self):
+        return {
+            'pid': os.getpid(),
+            'running': self.running,
+            'samples': self.samples,
+            'last_dump': self.last_dump,
+        }
+
+
+def get_sampler():
+    """Return the sampler of the current process, creating it if needed."""
+    global _SAMPLER
+    if _SAMPLER is None:
+        _SAMPLER = Sampler(CONF.sampler.interval, CONF.sampler.output_dir,
+                           CONF.sampler.blocked_interval)
+    return _SAMPLER
+
+
+def _handle_toggle(signum, frame):
+    get_sampler().toggle(CONF.sampler.duration)
+
+
+def setup_worker_signal():
+    """Toggle sampling sessions in this worker on SIGUSR2."""
+    if CONF.sampler.enable_signal:
+        signal.signal(signal.SIGUSR2, _handle_toggle)
+
+
+def setup_parent_signal(children):
+    """Forward SIGUSR2 received by the parent to the worker processes.
+
+    :param children: callable returning the pids of the live workers
+    """
+    if not CONF.sampler.enable_signal:
+        return
+
+    def _forward(signum, frame):
+        for pid in children():
+            try:
+                os.kill(pid, signal.SIGUSR2)
+            except OSError:
+                pass
+
+    signal.signal(signal.SIGUSR2, _forward)
@@ -0,0 +1,261 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Cross-worker request statistics kept in shared memory.
+
+The master process allocates a fixed-layout segment before forking the
+workers. Every worker owns exactly one slot of the segment and is the only
+process writing to it, so recording needs no locks. Any process holding the
+segment (the master or any worker) can read all the slots and aggregate them.
+"""
+
+import bisect
+import ctypes
+from multiprocessing import sharedctypes
+import os
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import excutils
+
+from clictest.common import timeutils
+from clictest.common import utils
+from clictest.i18n import _
+
+LOG = logging.getLogger(__name__)
+
+stats_opts = [
+    cfg.BoolOpt('enable_worker_stats', default=True,
+                help=_('Keep per-worker request counters, in-flight gauges '
+                       'and latency histograms in a shared memory segment '
+                       'created by the parent process, so that an aggregated '
+                       'view across all the workers is available.')),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(stats_opts)
+
+# Upper bounds, in seconds, of the request latency histogram buckets. The
+# last bucket of every slot implicitly holds everything above the last bound.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+
+_BUCKET_BOUNDS = tuple(int(bound * 1000000) for bound in LATENCY_BUCKETS)
+
+# Layout of a slot. Every field is a signed 64 bit integer; latencies are
+# stored in microseconds.
+PID = 0
+REQUESTS = 1
+IN_FLIGHT = 2
+RESPONSES = 3  # 1xx, 2xx, 3xx, 4xx and 5xx responses
+LATENCY_SUM = RESPONSES + 5
+LATENCY_HISTOGRAM = LATENCY_SUM + 1
+SLOT_SIZE = LATENCY_HISTOGRAM + len(LATENCY_BUCKETS) + 1
+
+STATUS_CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+
+_SEGMENT = None
+_WORKER_SLOT = None
+
+
+class WorkerSlot(object):
+    """Write side of the statistics of a single worker."""
+
+    def __init__(self, data, index):
+        self.index = index
+        self._data = data
+        self._base = index * SLOT_SIZE
+        self._requests = self._base + REQUESTS
+        self._in_flight = self._base + IN_FLIGHT
+        self._responses = self._base + RESPONSES - 1
+        self._latency_sum = self._base + LATENCY_SUM
+        self._histogram = self._base + LATENCY_HISTOGRAM
+
+    @property
+    def pid(self):
+        return self._data[self._base + PID]
+
+    def claim(self, pid):
+        """Bind the slot to a worker process.
+
+        Counters are left untouched so that they keep growing monotonically
+        when a respawned worker reuses the slot of a dead one, but the
+        in-flight gauge is reset since the requests of a dead worker will
+        never complete.
+        """
+        self._data[self._in_flight] = 0
+        self._data[self._base + PID] = pid
+
+    def release(self):
+        """Mark the slot as free. Called by the parent on worker exit."""
+        self._data[self._in_flight] = 0
+        self._data[self._base + PID] = 0
+
+    def request_started(self):
+        data = self._data
+        data[self._requests] += 1
+        data[self._in_flight] += 1
+
+    def request_finished(self, status, duration):
+        """Record a completed request.
+
+        :param status: integer HTTP status code of the response
+        :param duration: request duration in seconds
+        """
+        data = self._data
+        data[self._in_flight] -= 1
+        status_class = status // 100
+        if 1 <= status_class <= 5:
+            data[self._responses + status_class] += 1
+        micros = int(duration * 1000000)
+        data[self._latency_sum] += micros
+        data[self._histogram + bisect.bisect_left(_BUCKET_BOUNDS, micros)] += 1
+
+
+class StatsSegment(object):
+    """Fixed-layout shared memory segment holding one slot per worker.
+
+    The segment must be created before the workers are forked so that they
+    all inherit the same mapping.
+    """
+
+    def __init__(self, slots):
+        self.slots = slots
+        self._data = sharedctypes.RawArray(ctypes.c_int64, slots * SLOT_SIZE)
+
+    def slot(self, index):
+        return WorkerSlot(self._data, index)
+
+    def free_slot(self, taken=()):
+        """Return the index of a slot not bound to a live worker, or None.
+
+        :param taken: indexes reserved by the caller that must be skipped
+                      even though no worker claimed them yet
+        """
+        for index in range(self.slots):
+            if index in taken:
+                continue
+            if not self._data[index * SLOT_SIZE + PID]:
+                return index
+        return None
+
+    def _read_slot(self, index):
+        base = index * SLOT_SIZE
+        # NOTE: The slice copies the slot in one go, which keeps the time
+        # window for reading a half-updated slot as short as possible.
+        return self._data[base:base + SLOT_SIZE]
+
+    @staticmethod
+    def _format(values):
+        buckets = []
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ('+Inf',),
+                                values[LATENCY_HISTOGRAM:SLOT_SIZE]):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {
+            'requests': values[REQUESTS],
+            'in_flight': values[IN_FLIGHT],
+            'responses': dict(zip(STATUS_CLASSES,
+                                  values[RESPONSES:LATENCY_SUM])),
+            'latency_sum': values[LATENCY_SUM] / 1000000.0,
+            'latency_buckets': buckets,
+        }
+
+    def workers(self):
+        """Return the statistics of every slot in use, keyed by worker pid."""
+        result = {}
+        for index in range(self.slots):
+            values = self._read_slot(index)
+            if values[PID]:
+                result[values[PID]] = self._format(values)
+        return result
+
+    def aggregate(self):
+        """Return the statistics summed over all the slots.
+
+        Slots that are not bound to a live worker are included as well, so
+        the counters of respawned or reloaded workers are not lost.
+        """
+        totals = [0] * SLOT_SIZE
+        workers = 0
+        for index in range(self.slots):
+            values = self._read_slot(index)
+            if values[PID]:
+                workers += 1
+            for field in range(REQUESTS, SLOT_SIZE):
+                totals[field] += values[field]
+        result = self._format(totals)
+        result['workers'] = workers
+        return result
+
+
+class StatsMiddleware(object):
+    """Raw WSGI wrapper recording every request in a worker slot."""
+
+    def __init__(self, application, slot):
+        self.application = application
+        self.slot = slot
+
+    def __call__(self, environ, start_response):
+        slot = self.slot
+        status = [500]
+
+        def _start_response(status_line, headers, exc_info=None):
+            status[0] = int(status_line[:3])
+            return start_response(status_line, headers, exc_info)
+
+        slot.request_started()
+        start = timeutils.now()
+
+        def _finish():
+            slot.request_finished(status[0], timeutils.now() - start)
+
+        try:
+            result = self.application(environ, _start_response)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                _finish()
+        # NOTE: A request is in flight until its body has been sent.
+        return utils.on_response_closed(result, _finish)
+
+
+def create_segment(slots):
+    """Allocate the process-wide statistics segment.
+
+    :param slots: number of worker slots to allocate
+    """
+    global _SEGMENT
+    _SEGMENT = StatsSegment(slots)
+    LOG.debug("Allocated worker statistics segment with %d slots", slots)
+    return _SEGMENT
+
+
+def get_segment():
+    """Return the statistics segment, or None when stats are disabled."""
+    return _SEGMENT
+
+
+def set_worker_slot(slot):
+    """Bind the current process to the given slot of the segment."""
+    global _WORKER_SLOT
+    slot.claim(os.getpid())
+    _WORKER_SLOT = slot
+
+
+def get_worker_slot():
+    """Return the slot owned by the current process, if any."""
+    return _WORKER_SLOT
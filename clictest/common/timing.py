@@ -0,0 +1,120 @@
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Per-stage timing of API requests.
+
+A `RequestTimer` is stored in the WSGI environ by the request timing filter
+when timing is enabled. The middlewares, the router, `wsgi.Resource` and the
+controllers report the stages they go through with `stage()`, which costs a
+single dictionary lookup when no timer is present.
+"""
+
+from clictest.common import timeutils
+
+ENVIRON_KEY = 'clictest.timing'
+
+
+class _NullStage(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_STAGE = _NullStage()
+
+
+class _Stage(object):
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = timeutils.now()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timer.add(self.name, timeutils.now() - self.start)
+        return False
+
+
+class RequestTimer(object):
+    """Durations of the stages a request went through, in order."""
+
+    def __init__(self):
+        self.start = timeutils.now()
+        self.stages = []
+        self._pending = {}
+
+    def stage(self, name):
+        """Return a context manager timing the enclosed block as a stage."""
+        return _Stage(self, name)
+
+    def begin(self, name):
+        """Start timing a stage that does not map to a single block."""
+        self._pending[name] = timeutils.now()
+
+    def end(self, name):
+        """Stop timing a stage started with `begin`."""
+        start = self._pending.pop(name, None)
+        if start is not None:
+            self.add(name, timeutils.now() - start)
+
+    def add(self, name, duration):
+        self.stages.append((name, duration))
+
+    def elapsed(self):
+        return timeutils.now() - self.start
+
+    def server_timing(self, total=None):
+        """Format the stages as a ``Server-Timing`` header value."""
+        metrics = ['%s;dur=%.3f' % (name, duration * 1000)
+                   for name, duration in self.stages]
+        if total is not None:
+            metrics.append('total;dur=%.3f' % (total * 1000))
+        return ', '.join(metrics)
+
+    def breakdown(self):
+        """Format the stages as space separated key=value pairs."""
+        return ' '.join('%s=%.3fms' % (name, duration * 1000)
+                        for name, duration in self.stages)
+
+
+def get_timer(environ):
+    """Return the timer of the request, or None if timing is disabled."""
+    return environ.get(ENVIRON_KEY)
+
+
+def stage(environ, name):
+    """Time the enclosed block as a stage of the request, if timed."""
+    timer = environ.get(ENVIRON_KEY)
+    if timer is None:
+        return NULL_STAGE
+    return _Stage(timer, name)
+
+
+def begin(environ, name):
+    timer = environ.get(ENVIRON_KEY)
+    if timer is not None:
+        timer.begin(name)
+
+
+def end(environ, name):
+    timer = environ.get(ENVIRON_KEY)
+    if timer is not None:
+        timer.end(name)
@@ -12,6 +12,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import calendar
+import random
+import time
+
+import eventlet
+from eventlet import semaphore
 from keystoneauth1.identity import v3
 from keystoneauth1.loading import conf
 from keystoneauth1.loading import session
@@ -20,10 +26,31 @@ from keystoneclient.v3 import client as ks_client
 from oslo_config import cfg
 from oslo_log import log as logging
 
+from clictest.common import timeutils
+from clictest.i18n import _, _LW
+
+trust_opts = [
+    cfg.IntOpt('trust_token_lead_time', default=300, min=0,
+               help=_('Seconds before their expiry at which trust-scoped '
+                      'tokens are renewed in the background.')),
+    cfg.IntOpt('trust_token_jitter', default=60, min=0,
+               help=_('Maximum number of seconds randomly added to the lead '
+                      'time of every renewal of a trust-scoped token, so '
+                      'that the tokens obtained at the same time are not '
+                      'renewed at the same time.')),
+]
+
 CONF = cfg.CONF
+CONF.register_opts(trust_opts)
 
 LOG = logging.getLogger(__name__)
 
+# seconds a token must still be valid for to be handed out
+MIN_TOKEN_LIFE = 30
+
+# seconds between the attempts to renew a token after a failure
+RETRY_INTERVAL = 15
+
 
 class TokenRefresher(object):
     """Class that responsible for token refreshing with trusts"""
@@ -68,26 +95,85 @@ class TokenRefresher(object):
         # step 3: postpone trust-scoped client initialization
         # until we need to refresh the token
         self.trustee_client = None
+        self._token = None
+        self._expires = None
+        self._renewal = None
+        self._lock = semaphore.Semaphore()
 
     def refresh_token(self):
         """Receive new token if user need to update old token
 
+        The token is renewed in the background before it expires, so that
+        it is only requested here the first time, or when its renewal
+        failed until it expired.
+
         :return: new token that can be used for authentication
         """
+        if self._valid():
+            return self._token
+        with self._lock:
+            if not self._valid():
+                self._get_token()
+            return self._token
+
+    def _valid(self):
+        return (self._token is not None and
+                (self._expires is None or
+                 self._expires - time.time() > MIN_TOKEN_LIFE))
+
+    def _get_token(self):
+        """Request a new token and schedule its renewal."""
         LOG.debug("Requesting the new token with trust %s", self.trust_id)
         if self.trustee_client is None:
             self.trustee_client = self._refresh_trustee_client()
+        else:
+            # NOTE: The session caches the token until it expires.
+            self.trustee_client.session.auth.invalidate()
         try:
-            return self.trustee_client.session.get_token()
+            token = self.trustee_client.session.get_token()
         except ks_exceptions.Unauthorized:
             # in case of Unauthorized exceptions try to refresh client because
             # service user token may expired
             self.trustee_client = self._refresh_trustee_client()
-            return self.trustee_client.session.get_token()
+            token = self.trustee_client.session.get_token()
+
+        sess = self.trustee_client.session
+        expires = sess.auth.get_access(sess).expires
+        self._token = token
+        self._expires = None
+        if expires is not None:
+            self._expires = calendar.timegm(
+                timeutils.normalize_time(expires).timetuple())
+            life = self._expires - time.time()
+            lead_time = max(CONF.trust_token_lead_time, MIN_TOKEN_LIFE)
+            delay = (life - lead_time -
+                     random.uniform(0, CONF.trust_token_jitter))
+            # NOTE: Tokens living less than the lead time would be renewed
+            # over and over right away otherwise.
+            self._schedule(max(delay, life / 2, RETRY_INTERVAL))
+
+    def _schedule(self, delay):
+        if self._renewal is not None:
+            self._renewal.cancel()
+        self._renewal = eventlet.spawn_after(delay, self._renew)
+
+    def _renew(self):
+        self._renewal = None
+        try:
+            with self._lock:
+                self._get_token()
+        except Exception as e:
+            LOG.warn(_LW("Failed to renew the token of trust %(trust)s: "
+                         "%(error)s"), {'trust': self.trust_id, 'error': e})
+            if self._valid():
+                self._schedule(RETRY_INTERVAL)
 
     def release_resources(self):
         """Release keystone resources required for refreshing"""
 
+        if self._renewal is not None:
+            self._renewal.cancel()
+            self._renewal = None
         try:
             if self.trustee_client is None:
                 self._refresh_trustee_client().trusts.delete(self.trust_id)
@@ -107,6 +193,10 @@ class TokenRefresher(object):
             token=trustee_token,
             auth_url=self.auth_url
         )
+        if self.trustee_client is not None:
+            # NOTE: Keep the session, and its connections, of the client.
+            self.trustee_client.session.auth = trustee_auth
+            return self.trustee_client
         return self._load_client(trustee_auth, self.ssl_settings)
 
     @staticmethod
@@ -20,6 +20,7 @@
 System-level utilities and helper functions.
 """
 
+import collections
 import errno
 
 try:
@@ -245,6 +246,97 @@ class LimitingReader(object):
         return result
 
 
+class ClosingIterator(object):
+    """
+    Body of a WSGI response which calls `callback` once it is closed, that
+    is once the server has sent it or given up sending it.
+    """
+
+    def __init__(self, iterable, callback):
+        self._iterable = iterable
+        self._callback = callback
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+    def close(self):
+        try:
+            close = getattr(self._iterable, 'close', None)
+            if close is not None:
+                close()
+        finally:
+            callback, self._callback = self._callback, None
+            if callback is not None:
+                callback()
+
+
+def on_response_closed(result, callback):
+    """
+    Call `callback` once the body of a WSGI response has been sent.
+
+    Bodies which are lists or tuples are complete already, so `callback`
+    is called right away and the body returned as it is.
+
+    :param result: the iterable returned by a WSGI application
+    :returns: the iterable to return in place of `result`
+    """
+    if isinstance(result, (list, tuple)):
+        callback()
+        return result
+    return ClosingIterator(result, callback)
+
+
+class AllowedHosts(object):
+    """
+    The addresses allowed to reach an admin endpoint, given as a whitespace
+    separated list, or ``*`` to allow every address.
+    """
+
+    def __init__(self, allowed_hosts):
+        hosts = allowed_hosts.split()
+        if hosts == ['*']:
+            self._hosts = None
+        else:
+            self._hosts = frozenset(hosts)
+
+    def __contains__(self, remote_addr):
+        return self._hosts is None or remote_addr in self._hosts
+
+
+class LRUCache(object):
+    """
+    A mapping holding at most `maxsize` entries, which evicts the least
+    recently used entry when full.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            return default
+        self._data[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._data.pop(key, None)
+        self._data[key] = value
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        self._data.clear()
+
+
 def image_meta_to_http_headers(image_meta):
     """
     Returns a set of image metadata into a dict
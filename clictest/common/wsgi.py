@@ -21,18 +21,22 @@ Utility methods for working with WSGI servers
 """
 from __future__ import print_function
 
+import datetime
 import errno
 import functools
 import os
 import signal
+import struct
 import sys
 import time
+import weakref
 
 import eventlet
 from eventlet.green import socket
 from eventlet.green import ssl
 import eventlet.greenio
 import eventlet.wsgi
+import msgpack
 from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
@@ -49,6 +53,11 @@ from webob import multidict
 
 from clictest.common import config
 from clictest.common import exception
+from clictest.common import json_engine
+from clictest.common import sampler
+from clictest.common import stats
+from clictest.common import timeutils
+from clictest.common import timing
 from clictest.common import utils
 from clictest import i18n
 from clictest.i18n import _, _LE, _LI, _LW
@@ -113,6 +122,10 @@ wsgi_opts = [
                       'original request, even if it was removed by an SSL '
                       'terminating proxy. Typical value is '
                       '"HTTP_X_FORWARDED_PROTO".')),
+    cfg.IntOpt('route_cache_size', default=1024, min=0,
+               help=_('Maximum number of (method, path) pairs whose route '
+                      'match is remembered by the API routers. 0 disables '
+                      'the cache.')),
 ]
 
 
@@ -127,6 +140,20 @@ profiler_opts.set_defaults(CONF)
 
 ASYNC_EVENTLET_THREAD_POOL_LIST = []
 
+# Callables run in every worker process once it has started.
+_WORKER_HOOKS = []
+_worker_started = False
+
+MSGPACK_CONTENT_TYPE = 'application/x-msgpack'
+# MessagePack extension type of the datetimes.
+MSGPACK_DATETIME_EXT = 1
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+# Key of the environ under which a weak reference to the Request of a
+# request is cached.
+REQUEST_ENVIRON_KEY = 'clictest.request'
+
 
 def get_num_workers():
     """Return the configured number of workers."""
@@ -136,6 +163,27 @@ def get_num_workers():
     return CONF.workers
 
 
+def on_worker_start(hook):
+    """
+    Run `hook` in every worker process once it has started, or right away
+    if this process is a worker which has already started.
+
+    Hooks are the place for what does not survive forking, such as green
+    threads.
+    """
+    _WORKER_HOOKS.append(hook)
+    if _worker_started:
+        hook()
+
+
+def _start_worker():
+    global _worker_started
+    _worker_started = True
+    sampler.setup_worker_signal()
+    for hook in _WORKER_HOOKS:
+        hook()
+
+
 def get_bind_addr(default_port=None):
     """Return the host and port to bind to."""
     return (CONF.bind_host, CONF.bind_port or default_port)
@@ -257,6 +305,8 @@ class Server(object):
         self.children = set()
         self.stale_children = set()
         self.running = True
+        self.stats = None
+        self.stats_slots = {}
         self.pgid = os.getpid()
         try:
             # NOTE(flaper87): Make sure this process
@@ -289,12 +339,26 @@ class Server(object):
         self.application = application
         self.default_port = default_port
         self.configure()
+        self.create_stats_segment()
         self.start_wsgi()
 
+    def create_stats_segment(self):
+        """
+        Allocate the shared statistics segment before any worker is forked.
+
+        Twice as many slots as workers are allocated since workers being
+        replaced on reload keep their slot until they have finished serving
+        their pending requests.
+        """
+        if not CONF.enable_worker_stats:
+            return
+        self.stats = stats.create_segment(max(get_num_workers(), 1) * 2)
+
     def start_wsgi(self):
         workers = get_num_workers()
         if workers == 0:
             # Useful for profiling, test, debug etc.
+            _start_worker()
             self.pool = self.create_pool()
             self.pool.spawn_n(self._single_run, self.application, self.sock)
             return
@@ -303,6 +367,7 @@ class Server(object):
             signal.signal(signal.SIGTERM, self.kill_children)
             signal.signal(signal.SIGINT, self.kill_children)
             signal.signal(signal.SIGHUP, self.hup)
+            sampler.setup_parent_signal(lambda: list(self.children))
             while len(self.children) < workers:
                 self.run_child()
 
@@ -310,6 +375,9 @@ class Server(object):
         return get_asynchronous_eventlet_pool(size=self.threads)
 
     def _remove_children(self, pid):
+        slot = self.stats_slots.pop(pid, None)
+        if slot is not None:
+            self.stats.slot(slot).release()
         if pid in self.children:
             self.children.remove(pid)
             LOG.info(_LI('Removed dead child %s'), pid)
@@ -410,14 +478,24 @@ class Server(object):
             eventlet.wsgi.is_accepting = False
             self.sock.close()
 
+        slot = None
+        if self.stats is not None:
+            slot = self.stats.free_slot(taken=self.stats_slots.values())
+            if slot is None:
+                LOG.warn(_LW('No free worker statistics slot, requests of '
+                             'the next worker will not be accounted'))
+
         pid = os.fork()
         if pid == 0:
+            if slot is not None:
+                stats.set_worker_slot(self.stats.slot(slot))
             signal.signal(signal.SIGHUP, child_hup)
             signal.signal(signal.SIGTERM, signal.SIG_DFL)
             # ignore the interrupt signal to avoid a race whereby
             # a child worker receives the signal before the parent
             # and is respawned unnecessarily as a result
             signal.signal(signal.SIGINT, signal.SIG_IGN)
+            _start_worker()
             # The child has no need to stash the unwrapped
             # socket, and the reference prevents a clean
             # exit on sighup
@@ -430,6 +508,8 @@ class Server(object):
         else:
             LOG.info(_LI('Started child %s'), pid)
             self.children.add(pid)
+            if slot is not None:
+                self.stats_slots[pid] = slot
 
     def run_server(self):
         """Run a WSGI server."""
@@ -441,7 +521,7 @@ class Server(object):
         self.pool = self.create_pool()
         try:
             eventlet.wsgi.server(self.sock,
-                                 self.application,
+                                 self.get_application(),
                                  log=self._logger,
                                  custom_pool=self.pool,
                                  debug=False,
@@ -459,12 +539,27 @@ class Server(object):
     def _single_run(self, application, sock):
         """Start a WSGI server in a new green thread."""
         LOG.info(_LI("Starting single process server"))
-        eventlet.wsgi.server(sock, application, custom_pool=self.pool,
+        if self.stats is not None:
+            stats.set_worker_slot(self.stats.slot(0))
+        eventlet.wsgi.server(sock, self.get_application(application),
+                             custom_pool=self.pool,
                              log=self._logger,
                              debug=False,
                              keepalive=CONF.http_keepalive,
                              socket_timeout=self.client_socket_timeout)
 
+    def get_application(self, application=None):
+        """
+        Return the application to serve in this process, wrapped so that
+        requests are recorded in the worker statistics slot if one has been
+        assigned to the process.
+        """
+        application = application or self.application
+        slot = stats.get_worker_slot()
+        if slot is not None:
+            application = stats.StatsMiddleware(application, slot)
+        return application
+
     def configure_socket(self, old_conf=None, has_changed=None):
         """
         Ensure a socket exists and is appropriately configured.
@@ -546,6 +641,10 @@ class Middleware(object):
     behavior.
     """
 
+    # Name under which process_request is reported when request timing is
+    # enabled; defaults to the class name.
+    timing_stage = None
+
     def __init__(self, application):
         self.application = application
 
@@ -570,17 +669,55 @@ class Middleware(object):
         """Do whatever you'd like to the response."""
         return response
 
-    @webob.dec.wsgify
-    def __call__(self, req):
-        response = self.process_request(req)
-        if response:
-            return response
-        response = req.get_response(self.application)
-        response.request = req
+    def process_response_headers(self, req, headers):
+        """
+        Do whatever you'd like to the status line headers of the response.
+
+        Unlike process_response, this does not require the response of the
+        next application to be read into a webob.Response, so middlewares
+        which only add headers should prefer it.
+
+        :param req: the request
+        :param headers: list of (name, value) tuples of the response
+        :returns: the list of headers to send
+        """
+        return headers
+
+    def _overrides(self, name):
+        return (six.get_unbound_function(getattr(type(self), name)) is not
+                six.get_unbound_function(getattr(Middleware, name)))
+
+    def __call__(self, environ, start_response):
+        req = get_request(environ)
         try:
-            return self.process_response(response)
+            with timing.stage(environ,
+                              self.timing_stage or self.__class__.__name__):
+                response = self.process_request(req)
+            if response:
+                return response(environ, start_response)
+
+            if self._overrides('process_response_headers'):
+                def _start_response(status, headers, exc_info=None):
+                    return start_response(
+                        status, self.process_response_headers(req, headers),
+                        exc_info)
+            else:
+                _start_response = start_response
+
+            if not self._overrides('process_response'):
+                # NOTE: Nothing needs to look at the response, so it is not
+                # wrapped in a webob.Response.
+                return self.application(environ, _start_response)
+
+            response = req.get_response(self.application)
+            response.request = req
+            try:
+                response = self.process_response(response)
+            except webob.exc.HTTPException as e:
+                response = e
+            return response(environ, _start_response)
         except webob.exc.HTTPException as e:
-            return e
+            return e(environ, start_response)
 
 
 class Debug(Middleware):
@@ -633,6 +770,179 @@ class APIMapper(routes.Mapper):
         return routes.Mapper.routematch(self, url, environ)
 
 
+class RouteTable(object):
+    """
+    Precompiled dispatch table of the routes of a mapper.
+
+    Routes made of literal segments and of variables spanning whole
+    segments, whose only condition is on the method, are compiled. Those
+    without variables are resolved through a dict keyed on the path, the
+    others through a trie of their segments. The result of a match is
+    remembered for `route_cache_size` (method, path) pairs.
+
+    The table only gives an answer when it is certain the mapper would give
+    the same one: when the path could also be matched by a route which was
+    not compiled, or by more than one compiled route, the request method may
+    be overridden by a `_method` parameter, or the mapper itself is
+    configured in a way the table does not handle, `match` returns None and
+    the caller is expected to ask the mapper instead.
+    """
+
+    _VARIABLE = object()
+
+    def __init__(self, mapper, cache_size=None):
+        self.enabled = not (mapper.prefix or mapper.sub_domains or
+                            mapper.always_scan or mapper.debug)
+        if cache_size is None:
+            cache_size = CONF.route_cache_size
+        self._cache = utils.LRUCache(cache_size) if cache_size else None
+        self._static = {}
+        self._trie = {}
+        self._others = []
+        if not self.enabled:
+            return
+        # NOTE: The regular expressions of the routes which are not compiled
+        # are used to tell whether they could match a path.
+        mapper.create_regs()
+        for route in mapper.matchlist:
+            if route.static:
+                continue
+            segments = self._segments(route)
+            if segments is None:
+                self._others.append(route)
+            elif self._VARIABLE in [kind for kind, value in segments]:
+                node = self._trie
+                for kind, value in segments:
+                    node = node.setdefault(value if kind is None else kind,
+                                           {})
+                node.setdefault(None, []).append(
+                    (route, [value for kind, value in segments
+                             if kind is not None]))
+            else:
+                path = '/' + '/'.join(value for kind, value in segments)
+                self._static.setdefault(path, []).append(route)
+
+    def _segments(self, route):
+        """Split the path of a route into (kind, value) segments.
+
+        Literal segments are returned as (None, text) and variables as
+        (_VARIABLE, name). Returns None if the route cannot be compiled.
+        """
+        if (route.redirect or route.reqs or
+                set(route.conditions or {}) - set(['method'])):
+            return None
+        tokens = []
+        for part in route.routelist:
+            if not isinstance(part, dict):
+                if any(ord(char) > 127 for char in part):
+                    return None
+                tokens.extend(part)
+            elif part.get('type') != ':' or part['name'] == 'path_info':
+                return None
+            else:
+                tokens.append(part)
+        if not tokens or tokens[0] != '/':
+            return None
+
+        segments = []
+        index = 1
+        while True:
+            end = index
+            while end < len(tokens) and tokens[end] != '/':
+                end += 1
+            segment = tokens[index:end]
+            if len(segment) == 1 and isinstance(segment[0], dict):
+                segments.append((self._VARIABLE, segment[0]['name']))
+            elif segment and not any(isinstance(token, dict)
+                                     for token in segment):
+                segments.append((None, ''.join(segment)))
+            elif not segment and end == len(tokens) and not segments:
+                # NOTE: The root path '/'.
+                pass
+            else:
+                return None
+            if end == len(tokens):
+                return segments
+            index = end + 1
+
+    def _candidates(self, path):
+        routes_ = [(route, None) for route in self._static.get(path, ())]
+        if not path.startswith('/'):
+            return routes_
+        nodes = [(self._trie, [])]
+        for segment in path[1:].split('/'):
+            if not segment:
+                return routes_
+            matched = []
+            for node, values in nodes:
+                child = node.get(segment)
+                if child is not None:
+                    matched.append((child, values))
+                child = node.get(self._VARIABLE)
+                if child is not None:
+                    matched.append((child, values + [segment]))
+            if not matched:
+                return routes_
+            nodes = matched
+        for node, values in nodes:
+            for route, names in node.get(None, ()):
+                routes_.append((route, dict(zip(names, values))))
+        return routes_
+
+    def _match(self, method, path):
+        for route in self._others:
+            regmatch = getattr(route, 'regmatch', None)
+            if regmatch is None or regmatch.match(path):
+                return None
+        result = None
+        for route, values in self._candidates(path):
+            methods = (route.conditions or {}).get('method')
+            if methods is not None and method not in methods:
+                continue
+            if result is not None:
+                return None
+            match = dict(route.defaults)
+            if values:
+                for name, value in six.iteritems(values):
+                    if route.encoding and isinstance(value, bytes):
+                        try:
+                            value = value.decode(route.encoding,
+                                                 route.decode_errors)
+                        except UnicodeDecodeError:
+                            break
+                    match[name] = value
+                else:
+                    result = (match, route)
+            else:
+                result = (match, route)
+        return result or ({}, None)
+
+    def match(self, environ):
+        """Match a request against the table.
+
+        :returns: a (match dict, route) tuple, ({}, None) if no route
+                  matches, or None if the mapper has to be asked
+        """
+        if not self.enabled:
+            return None
+        if ('_method' in environ.get('QUERY_STRING', '') or
+                (environ['REQUEST_METHOD'] == 'POST' and
+                 routes.middleware.is_form_post(environ))):
+            return None
+        key = (environ['REQUEST_METHOD'], environ['PATH_INFO'])
+        cache = self._cache
+        if cache is not None:
+            result = cache.get(key)
+            if result is not None:
+                return dict(result[0]), result[1]
+        result = self._match(*key)
+        if result is None:
+            return None
+        if cache is not None:
+            cache[key] = result
+        return dict(result[0]), result[1]
+
+
 class RejectMethodController(object):
     def reject(self, req, allowed_methods, *args, **kwargs):
         LOG.debug("The method %s is not allowed for this resource",
@@ -672,39 +982,57 @@ class Router(object):
         """
         mapper.redirect("", "/")
         self.map = mapper
-        self._router = routes.middleware.RoutesMiddleware(self._dispatch,
-                                                          self.map)
+        self._routes_middleware = routes.middleware.RoutesMiddleware(
+            self._dispatch, self.map)
+        self._table = RouteTable(self.map)
+        self._router = self._route
 
     @classmethod
     def factory(cls, global_conf, **local_conf):
         return cls(APIMapper())
 
-    @webob.dec.wsgify
-    def __call__(self, req):
+    def __call__(self, environ, start_response):
         """
         Route the incoming request to a controller based on self.map.
         If no match, return either a 404(Not Found) or 501(Not Implemented).
         """
-        return self._router
+        timing.begin(environ, 'routing')
+        return self._router(environ, start_response)
+
+    def _route(self, environ, start_response):
+        """
+        Match the request through the dispatch table, falling back to the
+        routes middleware when the table cannot decide.
+        """
+        result = self._table.match(environ)
+        if result is None:
+            return self._routes_middleware(environ, start_response)
+        match, route = result
+        url = routes.URLGenerator(self.map, environ)
+        environ['wsgiorg.routing_args'] = (url, match)
+        environ['routes.route'] = route
+        environ['routes.url'] = url
+        return self._dispatch(environ, start_response)
 
     @staticmethod
-    @webob.dec.wsgify
-    def _dispatch(req):
+    def _dispatch(environ, start_response):
         """
         Called by self._router after matching the incoming request to a route
-        and putting the information into req.environ.  Either returns 404,
+        and putting the information into the environ.  Either returns 404,
         501, or the routed WSGI app's response.
         """
-        match = req.environ['wsgiorg.routing_args'][1]
+        timing.end(environ, 'routing')
+        match = environ['wsgiorg.routing_args'][1]
         if not match:
             implemented_http_methods = ['GET', 'HEAD', 'POST', 'PUT',
                                         'DELETE', 'PATCH']
-            if req.environ['REQUEST_METHOD'] not in implemented_http_methods:
-                return webob.exc.HTTPNotImplemented()
+            if environ['REQUEST_METHOD'] not in implemented_http_methods:
+                app = webob.exc.HTTPNotImplemented()
             else:
-                return webob.exc.HTTPNotFound()
-        app = match['controller']
-        return app
+                app = webob.exc.HTTPNotFound()
+        else:
+            app = match['controller']
+        return app(environ, start_response)
 
 
 class Request(webob.Request):
@@ -717,11 +1045,15 @@ class Request(webob.Request):
                 environ['wsgi.url_scheme'] = scheme
         super(Request, self).__init__(environ, *args, **kwargs)
 
-    def best_match_content_type(self):
-        """Determine the requested response content-type."""
-        supported = ('application/json',)
+    def best_match_content_type(self, supported=None):
+        """Determine the requested response content-type.
+
+        :param supported: content types to choose from, the first one being
+                          the default; JSON and MessagePack if not given
+        """
+        supported = supported or ('application/json', MSGPACK_CONTENT_TYPE)
         bm = self.accept.best_match(supported)
-        return bm or 'application/json'
+        return bm or supported[0]
 
     def get_content_type(self, allowed_content_types):
         """Determine content type of the request body."""
@@ -757,6 +1089,46 @@ class Request(webob.Request):
             return range_
 
 
+def get_request(environ):
+    """
+    Return the Request wrapping `environ`.
+
+    The request is built once and cached in the environ, so that the
+    middlewares, the router and the resource of a request share it instead
+    of each wrapping the environ again. Only a weak reference is cached, the
+    request being kept alive by the middleware which built it, so that the
+    environ and the request do not form a reference cycle.
+    """
+    ref = environ.get(REQUEST_ENVIRON_KEY)
+    req = ref() if ref is not None else None
+    if req is None or req.environ is not environ:
+        req = Request(environ)
+        environ[REQUEST_ENVIRON_KEY] = weakref.ref(req)
+    return req
+
+
+class RawResponse(object):
+    """
+    WSGI response writing its status line and headers directly.
+
+    A cheaper alternative to webob.Response for the responses of the hot
+    routes, whose body is known up front.
+    """
+
+    def __init__(self, status, body, content_type='application/json'):
+        self.status = status
+        self.body = body
+        self.content_type = content_type
+
+    def __call__(self, environ, start_response):
+        start_response(self.status,
+                       [('Content-Type', self.content_type),
+                        ('Content-Length', str(len(self.body)))])
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        return [self.body]
+
+
 class JSONRequestDeserializer(object):
     valid_transfer_encoding = frozenset(['chunked', 'compress', 'deflate',
                                          'gzip', 'identity'])
@@ -782,8 +1154,19 @@ class JSONRequestDeserializer(object):
         return obj
 
     def from_json(self, datastring):
+        # NOTE: The sanitizer is only given to the engine when overridden,
+        # calling it for every object of the document is wasted otherwise.
+        # Python 2 creates an unbound method on every access of a method,
+        # so the functions are compared.
+        sanitizer = type(self)._sanitizer
+        if (getattr(sanitizer, '__func__', sanitizer) is
+                JSONRequestDeserializer._sanitizer):
+            object_hook = None
+        else:
+            object_hook = self._sanitizer
         try:
-            jsondata = jsonutils.loads(datastring, object_hook=self._sanitizer)
+            jsondata = json_engine.get_engine().loads(datastring,
+                                                      object_hook=object_hook)
             if not isinstance(jsondata, (dict, list)):
                 msg = _('Unexpected body type. Expected list/dict.')
                 raise webob.exc.HTTPBadRequest(explanation=msg)
@@ -799,10 +1182,50 @@ class JSONRequestDeserializer(object):
             return {}
 
 
+def _msgpack_ext_hook(code, data):
+    if code == MSGPACK_DATETIME_EXT:
+        seconds, microseconds = struct.unpack('!qI', data)
+        return _EPOCH + datetime.timedelta(seconds=seconds,
+                                           microseconds=microseconds)
+    return msgpack.ExtType(code, data)
+
+
+class MessagePackRequestDeserializer(JSONRequestDeserializer):
+    """
+    Deserializer of MessagePack request bodies.
+
+    Dates encoded as the MSGPACK_DATETIME_EXT extension type are decoded to
+    naive UTC datetimes.
+    """
+
+    def from_msgpack(self, data):
+        try:
+            data = msgpack.unpackb(data, ext_hook=_msgpack_ext_hook,
+                                   raw=False)
+        except Exception:
+            # NOTE: msgpack raises many unrelated errors on malformed input.
+            msg = _('Malformed MessagePack in request body.')
+            raise webob.exc.HTTPBadRequest(explanation=msg)
+        if not isinstance(data, (dict, list)):
+            msg = _('Unexpected body type. Expected list/dict.')
+            raise webob.exc.HTTPBadRequest(explanation=msg)
+        return data
+
+    def default(self, request):
+        if self.has_body(request):
+            return {'body': self.from_msgpack(request.body)}
+        else:
+            return {}
+
+
 class JSONResponseSerializer(object):
 
     def _sanitizer(self, obj):
         """Sanitizer method that will be passed to jsonutils.dumps."""
+        if isinstance(obj, datetime.datetime):
+            # NOTE: Same format as jsonutils.to_primitive, without going
+            # through its checks of the other types.
+            return obj.strftime(timeutils.PERFECT_TIME_FORMAT)
         if hasattr(obj, "to_dict"):
             return obj.to_dict()
         if isinstance(obj, multidict.MultiDict):
@@ -810,7 +1233,7 @@ class JSONResponseSerializer(object):
         return jsonutils.to_primitive(obj)
 
     def to_json(self, data):
-        return jsonutils.dump_as_bytes(data, default=self._sanitizer)
+        return json_engine.get_engine().dumps(data, default=self._sanitizer)
 
     def default(self, response, result):
         response.content_type = 'application/json'
@@ -819,6 +1242,130 @@ class JSONResponseSerializer(object):
         response.body = body
 
 
+class MessagePackResponseSerializer(JSONResponseSerializer):
+    """
+    Serializer of MessagePack response bodies.
+
+    Datetimes are encoded as the MSGPACK_DATETIME_EXT extension type, whose
+    data are the big-endian signed 64 bit number of seconds since the epoch
+    and the unsigned 32 bit number of microseconds, in UTC. Other objects
+    are sanitized as for JSON.
+    """
+
+    def _ext_default(self, obj):
+        if isinstance(obj, datetime.datetime):
+            if obj.tzinfo is not None:
+                obj = timeutils.normalize_time(obj)
+            delta = obj - _EPOCH
+            return msgpack.ExtType(
+                MSGPACK_DATETIME_EXT,
+                struct.pack('!qI', delta.days * 86400 + delta.seconds,
+                            delta.microseconds))
+        return self._sanitizer(obj)
+
+    def to_msgpack(self, data):
+        return msgpack.packb(data, default=self._ext_default,
+                             use_bin_type=True)
+
+    def default(self, response, result):
+        response.content_type = MSGPACK_CONTENT_TYPE
+        response.body = self.to_msgpack(result)
+
+
+def _is_iterator(obj):
+    return ((hasattr(obj, '__next__') or hasattr(obj, 'next')) and
+            hasattr(obj, '__iter__'))
+
+
+class StreamingJSONResponseSerializer(JSONResponseSerializer):
+    """
+    JSON serializer writing iterator results as they are produced.
+
+    When an action returns an iterator, such as a generator, or a dict some
+    values of which are iterators, the iterators are encoded as JSON arrays
+    one item at a time into a chunked response, instead of being
+    materialized first. Encoded items are buffered until `chunk_size` bytes
+    are pending; the next items are only pulled once the server has written
+    the previous chunk to the client, so a slow client slows the iteration
+    down rather than letting the body pile up in memory.
+
+    Other results are serialized as by JSONResponseSerializer. Controllers
+    opt in by building their Resource with this serializer.
+    """
+
+    def __init__(self, chunk_size=65536):
+        self.chunk_size = chunk_size
+
+    def _streams(self, result):
+        if _is_iterator(result):
+            return True
+        return (isinstance(result, dict) and
+                any(_is_iterator(value) for value in result.values()))
+
+    def _encode(self, obj, iterators):
+        if _is_iterator(obj):
+            iterators.append(obj)
+            yield b'['
+            first = True
+            for item in obj:
+                if not first:
+                    yield b', '
+                first = False
+                for part in self._encode(item, iterators):
+                    yield part
+            yield b']'
+        elif isinstance(obj, dict) and self._streams(obj):
+            yield b'{'
+            first = True
+            for key, value in six.iteritems(obj):
+                if not first:
+                    yield b', '
+                first = False
+                yield self.to_json(six.text_type(key)) + b': '
+                for part in self._encode(value, iterators):
+                    yield part
+            yield b'}'
+        else:
+            yield encodeutils.to_utf8(self.to_json(obj))
+
+    def iter_json(self, result):
+        """Yield the JSON encoding of `result` in chunks of about
+        `chunk_size` bytes.
+        """
+        iterators = []
+        buffered = []
+        size = 0
+        try:
+            for part in self._encode(result, iterators):
+                buffered.append(part)
+                size += len(part)
+                if size >= self.chunk_size:
+                    yield b''.join(buffered)
+                    buffered = []
+                    size = 0
+            if buffered:
+                yield b''.join(buffered)
+        except Exception:
+            # NOTE: The status line is gone already; the client can only
+            # tell from the truncated body that something went wrong.
+            LOG.exception(_LE("Error while streaming a JSON response"))
+            raise
+        finally:
+            # NOTE: Release what the iterators of the controller hold when
+            # the client goes away before the end of the body.
+            for iterator in iterators:
+                close = getattr(iterator, 'close', None)
+                if close is not None:
+                    close()
+
+    def default(self, response, result):
+        if not self._streams(result):
+            return super(StreamingJSONResponseSerializer, self).default(
+                response, result)
+        response.content_type = 'application/json'
+        response.app_iter = self.iter_json(result)
+
+
 def translate_exception(req, e):
     """Translates all translatable elements of the given exception."""
 
@@ -867,54 +1414,115 @@ class Resource(object):
         self.controller = controller
         self.serializer = serializer or JSONResponseSerializer()
         self.deserializer = deserializer or JSONRequestDeserializer()
+        self.content_types = {}
+        self._offers = None
+        if serializer is None and deserializer is None:
+            self.register_content_type(MSGPACK_CONTENT_TYPE,
+                                       MessagePackRequestDeserializer(),
+                                       MessagePackResponseSerializer())
+
+    def register_content_type(self, content_type, deserializer, serializer):
+        """
+        Serve another content type than the one of the default serializer.
 
-    @webob.dec.wsgify(RequestClass=Request)
-    def __call__(self, request):
+        Request bodies of that Content-Type are read with `deserializer`, and
+        responses are written with `serializer` when the Accept header of the
+        request prefers that content type to JSON.
+        """
+        self.content_types[content_type] = (deserializer, serializer)
+        self._offers = ('application/json',) + tuple(self.content_types)
+
+    def _negotiate(self, request):
+        """Return the deserializer and serializer of a request."""
+        deserializer = self.deserializer
+        serializer = self.serializer
+        if not self.content_types:
+            return deserializer, serializer
+        environ = request.environ
+        content_type = environ.get('CONTENT_TYPE')
+        if content_type:
+            content_type = content_type.split(';', 1)[0].strip().lower()
+            if content_type in self.content_types:
+                deserializer = self.content_types[content_type][0]
+        # NOTE: Spare parsing the Accept header of the usual requests, for
+        # which JSON is preferred anyway.
+        accept = environ.get('HTTP_ACCEPT')
+        if accept and accept not in ('*/*', 'application/json'):
+            best = request.best_match_content_type(self._offers)
+            if best in self.content_types:
+                serializer = self.content_types[best][1]
+        return deserializer, serializer
+
+    def __call__(self, environ, start_response):
         """WSGI method that controls (de)serialization and method dispatch."""
-        action_args = self.get_action_args(request.environ)
+        request = get_request(environ)
+        action_args = self.get_action_args(environ)
         action = action_args.pop('action', None)
         body_reject = strutils.bool_from_string(
             action_args.pop('body_reject', None))
+        deserializer, serializer = self._negotiate(request)
 
         try:
-            if body_reject and self.deserializer.has_body(request):
+            if body_reject and deserializer.has_body(request):
                 msg = _('A body is not expected with this request.')
                 raise webob.exc.HTTPBadRequest(explanation=msg)
-            deserialized_request = self.dispatch(self.deserializer,
-                                                 action, request)
+            with timing.stage(environ, 'deserialize'):
+                deserialized_request = self.dispatch(deserializer,
+                                                     action, request)
             action_args.update(deserialized_request)
-            action_result = self.dispatch(self.controller, action,
-                                          request, **action_args)
+            with timing.stage(environ, 'dispatch'):
+                action_result = self.dispatch(self.controller, action,
+                                              request, **action_args)
         except webob.exc.WSGIHTTPException as e:
-            exc_info = sys.exc_info()
             e = translate_exception(request, e)
-            six.reraise(type(e), e, exc_info[2])
+            return e(environ, start_response)
         except UnicodeDecodeError:
             msg = _("Error decoding your request. Either the URL or the "
                     "request body contained characters that could not be "
                     "decoded by Glance")
-            raise webob.exc.HTTPBadRequest(explanation=msg)
+            return webob.exc.HTTPBadRequest(explanation=msg)(environ,
+                                                             start_response)
         except Exception as e:
             LOG.exception(_LE("Caught error: %s"),
                           encodeutils.exception_to_unicode(e))
             response = webob.exc.HTTPInternalServerError()
-            return response
+            return response(environ, start_response)
 
         try:
-            response = webob.Response(request=request)
-            self.dispatch(self.serializer, action, response, action_result)
+            with timing.stage(environ, 'serialize'):
+                if self._serializes_json(serializer, action):
+                    body = encodeutils.to_utf8(
+                        serializer.to_json(action_result))
+                    response = RawResponse('200 OK', body)
+                else:
+                    response = webob.Response(request=request)
+                    self.dispatch(serializer, action, response,
+                                  action_result)
             # encode all headers in response to utf-8 to prevent unicode errors
-            for name, value in list(response.headers.items()):
-                if six.PY2 and isinstance(value, six.text_type):
-                    response.headers[name] = encodeutils.safe_encode(value)
-            return response
+            if six.PY2 and isinstance(response, webob.Response):
+                for name, value in list(response.headers.items()):
+                    if isinstance(value, six.text_type):
+                        response.headers[name] = encodeutils.safe_encode(
+                            value)
         except webob.exc.WSGIHTTPException as e:
-            return translate_exception(request, e)
+            response = translate_exception(request, e)
         except webob.exc.HTTPException as e:
-            return e
+            response = e
         # return unserializable result (typically a webob exc)
         except Exception:
-            return action_result
+            response = action_result
+        return response(environ, start_response)
+
+    @staticmethod
+    def _serializes_json(serializer, action):
+        """
+        Whether the action result is serialized by the plain JSON
+        serializer, in which case the response is written directly.
+        """
+        return (isinstance(serializer, JSONResponseSerializer) and
+                not hasattr(serializer, action) and
+                six.get_unbound_function(type(serializer).default) is
+                six.get_unbound_function(JSONResponseSerializer.default))
 
     def dispatch(self, obj, action, *args, **kwargs):
         """Find action-specific method on self and call it."""
@@ -33,10 +33,22 @@ class RequestContext(context.RequestContext):
         self.roles = roles or []
         self.owner_is_tenant = owner_is_tenant
         self.service_catalog = service_catalog
-        self.policy_enforcer = policy_enforcer or policy.Enforcer()
+        self._policy_enforcer = policy_enforcer
+        # NOTE: Contexts created as admin, such as the ones of the
+        # unauthenticated pipeline, never need the enforcer.
         if not self.is_admin:
             self.is_admin = self.policy_enforcer.check_is_admin(self)
 
+    @property
+    def policy_enforcer(self):
+        if self._policy_enforcer is None:
+            self._policy_enforcer = policy.get_enforcer()
+        return self._policy_enforcer
+
+    @policy_enforcer.setter
+    def policy_enforcer(self, value):
+        self._policy_enforcer = value
+
     def to_dict(self):
         d = super(RequestContext, self).to_dict()
         d.update({
@@ -20,12 +20,20 @@ import copy
 import itertools
 
 import clictest.api.middleware.context
+import clictest.api.middleware.timing
+import clictest.api.policy
+import clictest.api.v1.objectspy
 import clictest.api.versions
+import clictest.common.auth
 import clictest.common.config
+import clictest.common.json_engine
 import clictest.common.location_strategy
 import clictest.common.location_strategy.store_type
 import clictest.common.property_utils
 import clictest.common.rpc
+import clictest.common.sampler
+import clictest.common.stats
+import clictest.common.trust_auth
 import clictest.common.wsgi
 
 
@@ -33,17 +41,26 @@ import clictest.common.wsgi
 _api_opts = [
     (None, list(itertools.chain(
         clictest.api.middleware.context.context_opts,
+        clictest.api.middleware.timing.timing_opts,
+        clictest.api.policy.policy_opts,
+        clictest.api.v1.objectspy.objectspy_opts,
         clictest.api.versions.versions_opts,
+        clictest.common.auth.auth_opts,
         clictest.common.config.common_opts,
+        clictest.common.json_engine.json_engine_opts,
         clictest.common.location_strategy.location_strategy_opts,
         clictest.common.property_utils.property_opts,
         clictest.common.rpc.rpc_opts,
+        clictest.common.stats.stats_opts,
+        clictest.common.trust_auth.trust_opts,
         clictest.common.wsgi.bind_opts,
         clictest.common.wsgi.eventlet_opts,
-        clictest.common.wsgi.socket_opts))),
+        clictest.common.wsgi.socket_opts,
+        clictest.common.wsgi.wsgi_opts))),
     ('image_format', clictest.common.config.image_format_opts),
     ('task', clictest.common.config.task_opts),
     ('profiler', clictest.common.wsgi.profiler_opts),
+    ('sampler', clictest.common.sampler.sampler_opts),
     ('paste_deploy', clictest.common.config.paste_deploy_opts)
 ]
 
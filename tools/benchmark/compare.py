@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Compare two reports written by run.py, typically of two commits.
+"""
+
+import argparse
+import json
+import sys
+
+
+def _key(result):
+    return (result['flavor'], result['route'], result['concurrency'])
+
+
+def _change(old, new):
+    if not old or new is None:
+        return '     n/a'
+    return '%+7.1f%%' % ((new - old) * 100.0 / old)
+
+
+def _max_rss(result):
+    values = [rss for rss in result['rss_kb'].values() if rss is not None]
+    return max(values) if values else None
+
+
+def compare(old, new, out=sys.stdout):
+    old_results = dict((_key(r), r) for r in old['results'])
+    out.write('old: %s\nnew: %s\n\n' % (old['meta']['revision'],
+                                        new['meta']['revision']))
+    out.write('%-14s %-3s %5s %12s %8s %10s %8s %10s %8s\n' % (
+        'flavor', 'rt', 'conc', 'req/s', 'change', 'p99 ms', 'change',
+        'rss kB', 'change'))
+    for result in new['results']:
+        before = old_results.get(_key(result))
+        if before is None:
+            continue
+        out.write('%-14s %-3s %5d %12.1f %s %10s %s %10s %s\n' % (
+            result['flavor'], result['route'], result['concurrency'],
+            result['throughput'],
+            _change(before['throughput'], result['throughput']),
+            result['latency_ms']['p99'],
+            _change(before['latency_ms']['p99'], result['latency_ms']['p99']),
+            _max_rss(result),
+            _change(_max_rss(before), _max_rss(result))))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('old', help='Report of the baseline.')
+    parser.add_argument('new', help='Report to compare to the baseline.')
+    args = parser.parse_args(argv)
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    compare(old, new)
+
+
+if __name__ == '__main__':
+    main()
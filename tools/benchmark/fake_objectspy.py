@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Local stand-in for the ObjectSpyWeb service used by the benchmarks.
+
+It answers the getObjectspyFile calls made by the v1 objectspy controller
+after a configurable latency, with a payload of a configurable size, and
+fails a configurable share of them with a 500 error.
+"""
+
+import argparse
+import random
+import sys
+
+import eventlet
+eventlet.monkey_patch(socket=True, time=True, select=True)
+
+from eventlet import wsgi  # noqa
+
+OBJECTSPY_PATH = '/ObjectSpyWeb/services/objectspy/getObjectspyFile'
+
+# NOTE: Markup with characters the API has to percent-encode, so that the
+# cost of quoting the payload is representative.
+_CHUNK = '<div class="spy" id="node">Object &amp; "spy" line</div>\n'
+
+
+def make_payload(size):
+    return (_CHUNK * (size // len(_CHUNK) + 1))[:size].encode('utf-8')
+
+
+class FakeObjectSpy(object):
+
+    def __init__(self, latency=0.0, jitter=0.0, payload=4096,
+                 error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.body = make_payload(payload)
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    def __call__(self, environ, start_response):
+        if environ['PATH_INFO'] != OBJECTSPY_PATH:
+            start_response('404 Not Found', [('Content-Length', '0')])
+            return [b'']
+
+        delay = self.latency
+        if self.jitter:
+            delay += self.random.uniform(0, self.jitter)
+        if delay:
+            eventlet.sleep(delay)
+
+        if self.random.random() < self.error_rate:
+            start_response('500 Internal Server Error',
+                           [('Content-Length', '0')])
+            return [b'']
+
+        start_response('200 OK',
+                       [('Content-Type', 'text/html; charset=UTF-8'),
+                        ('Content-Length', str(len(self.body)))])
+        return [self.body]
+
+
+def serve(host, port, app, ready=None):
+    sock = eventlet.listen((host, port))
+    if ready is not None:
+        ready(sock.getsockname()[1])
+    wsgi.server(sock, app, log_output=False, max_size=10000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0,
+                        help='Port to listen on, 0 picks a free one.')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Latency added to every response, in ms.')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Upper bound of a random latency added on top '
+                             'of --latency, in ms.')
+    parser.add_argument('--payload', type=int, default=4096,
+                        help='Size of the response body, in bytes.')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of the calls answered with a 500 error, '
+                             'between 0 and 1.')
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    app = FakeObjectSpy(latency=args.latency / 1000.0,
+                        jitter=args.jitter / 1000.0,
+                        payload=args.payload,
+                        error_rate=args.error_rate,
+                        seed=args.seed)
+
+    def ready(port):
+        # NOTE: The benchmark runner reads the port from the first line.
+        sys.stdout.write('%d\n' % port)
+        sys.stdout.flush()
+
+    serve(args.host, args.port, app, ready=ready)
+
+
+if __name__ == '__main__':
+    main()
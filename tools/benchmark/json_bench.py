@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of the JSON serialization of the API.
+
+Operations per second of JSONResponseSerializer.to_json and
+JSONRequestDeserializer.from_json are measured for a few documents with
+every JSON engine available, along with the jsonutils calls they replaced.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sys
+
+from monotonic import monotonic as now
+from oslo_config import cfg
+from oslo_serialization import jsonutils
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+
+from clictest.common import json_engine  # noqa
+from clictest.common import wsgi  # noqa
+
+CONF = cfg.CONF
+
+_CREATED = datetime.datetime(2016, 3, 1, 12, 30, 15, 250000)
+
+
+def _record(index):
+    return {
+        'id': '5e3a1c27-%012d' % index,
+        'name': 'object-%d' % index,
+        'status': 'active',
+        'size': 1024 * index,
+        'tags': ['spy', 'browser', u'caf\xe9'],
+        'created_at': _CREATED,
+        'properties': {'browser': 'firefox', 'chvr': '52.0', 'depth': 3},
+    }
+
+
+DOCUMENTS = {
+    # NOTE: What the v1 objectspy controller returns.
+    'quoted-page': ('%3Cdiv%20class%3D%22spy%22%3EObject%3C/div%3E%0A' *
+                    200),
+    'record': _record(1),
+    'list-100': [_record(i) for i in range(100)],
+    'list-5000': [_record(i) for i in range(5000)],
+}
+
+
+def _operations_per_second(operation, duration):
+    count = 0
+    start = now()
+    while True:
+        operation()
+        count += 1
+        elapsed = now() - start
+        if elapsed >= duration:
+            return count / elapsed
+
+
+def _engines():
+    engines = ['stdlib']
+    if json_engine.orjson is not None:
+        engines.append('orjson')
+    return engines
+
+
+def run(args):
+    serializer = wsgi.JSONResponseSerializer()
+    deserializer = wsgi.JSONRequestDeserializer()
+    results = []
+    for name, document in sorted(DOCUMENTS.items()):
+        encoded = jsonutils.dump_as_bytes(document,
+                                          default=serializer._sanitizer)
+        expected = jsonutils.loads(encoded)
+        # NOTE: Request bodies can only be objects or arrays.
+        loads = isinstance(document, (dict, list))
+        operations = [
+            ('jsonutils', 'dumps',
+             lambda: jsonutils.dump_as_bytes(document,
+                                             default=serializer._sanitizer)),
+        ]
+        if loads:
+            operations.append(
+                ('jsonutils', 'loads',
+                 lambda: jsonutils.loads(
+                     encoded, object_hook=deserializer._sanitizer)))
+        for engine in _engines():
+            operations.append((engine, 'dumps',
+                               lambda: serializer.to_json(document)))
+            if loads:
+                operations.append((engine, 'loads',
+                                   lambda: deserializer.from_json(encoded)))
+        for engine, operation, call in operations:
+            if engine != 'jsonutils':
+                CONF.set_override('json_engine', engine)
+            result = call()
+            if operation == 'dumps':
+                result = jsonutils.loads(result)
+            results.append({
+                'document': name,
+                'size': len(encoded),
+                'engine': engine,
+                'operation': operation,
+                'identical': result == expected,
+                'per_second': _operations_per_second(call, args.duration),
+            })
+    CONF.clear_override('json_engine')
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--duration', type=float, default=0.5,
+                        help='Seconds each operation is repeated for.')
+    parser.add_argument('--json', action='store_true',
+                        help='Write the results as JSON.')
+    args = parser.parse_args(argv)
+    CONF([], project='clictest')
+
+    results = run(args)
+    if args.json:
+        sys.stdout.write(json.dumps(results, indent=2, sort_keys=True) + '\n')
+        return
+
+    baseline = dict(((r['document'], r['operation']), r['per_second'])
+                    for r in results if r['engine'] == 'jsonutils')
+    sys.stdout.write('%-12s %9s %-10s %-6s %12s %8s\n' % (
+        'document', 'bytes', 'engine', 'op', 'ops/s', 'speedup'))
+    for result in results:
+        if not result['identical']:
+            sys.stderr.write('%(engine)s %(operation)s of %(document)s '
+                             'differs from jsonutils\n' % result)
+        sys.stdout.write('%-12s %9d %-10s %-6s %12.1f %7.2fx\n' % (
+            result['document'], result['size'], result['engine'],
+            result['operation'], result['per_second'],
+            result['per_second'] /
+            baseline[(result['document'], result['operation'])]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of MessagePack against JSON.
+
+The documents of json_bench.py are encoded and decoded by the MessagePack
+serializer and deserializer of the API and by their JSON counterparts, with
+the configured JSON engine, and by the RPC JSON serializer, which encodes
+dates as tagged objects. The size of the encoded documents is reported
+along with the operations per second.
+"""
+
+import argparse
+import json
+import sys
+
+from oslo_config import cfg
+
+# NOTE: Also puts the root of the tree on the path.
+import json_bench
+from clictest.common import rpc  # noqa
+from clictest.common import wsgi  # noqa
+
+CONF = cfg.CONF
+
+
+def _formats():
+    json_serializer = wsgi.JSONResponseSerializer()
+    json_deserializer = wsgi.JSONRequestDeserializer()
+    rpc_serializer = rpc.RPCJSONSerializer()
+    rpc_deserializer = rpc.RPCJSONDeserializer()
+    msgpack_serializer = wsgi.MessagePackResponseSerializer()
+    msgpack_deserializer = wsgi.MessagePackRequestDeserializer()
+    return [
+        ('json', json_serializer.to_json, json_deserializer.from_json),
+        ('rpc-json', rpc_serializer.to_json, rpc_deserializer.from_json),
+        ('msgpack', msgpack_serializer.to_msgpack,
+         msgpack_deserializer.from_msgpack),
+    ]
+
+
+def run(args):
+    results = []
+    for name, document in sorted(json_bench.DOCUMENTS.items()):
+        if not isinstance(document, (dict, list)):
+            continue
+        for fmt, dumps, loads in _formats():
+            encoded = dumps(document)
+            results.append({
+                'document': name,
+                'format': fmt,
+                'size': len(encoded),
+                'round_trip': loads(encoded) == document,
+                'dumps_per_second': json_bench._operations_per_second(
+                    lambda: dumps(document), args.duration),
+                'loads_per_second': json_bench._operations_per_second(
+                    lambda: loads(encoded), args.duration),
+            })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--duration', type=float, default=0.5,
+                        help='Seconds each operation is repeated for.')
+    parser.add_argument('--json', action='store_true',
+                        help='Write the results as JSON.')
+    args = parser.parse_args(argv)
+    CONF([], project='clictest')
+
+    results = run(args)
+    if args.json:
+        sys.stdout.write(json.dumps(results, indent=2, sort_keys=True) + '\n')
+        return
+
+    sys.stdout.write('%-10s %-9s %9s %-6s %12s %12s\n' % (
+        'document', 'format', 'bytes', 'exact', 'dumps/s', 'loads/s'))
+    for result in results:
+        sys.stdout.write('%-10s %-9s %9d %-6s %12.1f %12.1f\n' % (
+            result['document'], result['format'], result['size'],
+            result['round_trip'], result['dumps_per_second'],
+            result['loads_per_second']))
+
+
+if __name__ == '__main__':
+    main()
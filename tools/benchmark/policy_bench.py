@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of the policy decisions.
+
+Decisions per second are measured for every rule of a policy, with the
+oslo.policy interpreter, with the compiled rules and with the compiled rules
+behind the decision cache. The rules are the defaults of the API extended
+with a policy typical of a deployment, or the rules of a policy file.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from monotonic import monotonic as now
+from oslo_config import cfg
+from oslo_policy import policy as oslo_policy
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+
+from clictest.api import policy  # noqa
+# NOTE: Registers the oslo.policy options.
+from clictest.common import config  # noqa
+import clictest.context  # noqa
+
+CONF = cfg.CONF
+
+SAMPLE_RULES = {
+    'context_is_admin': 'role:admin',
+    'default': 'role:admin',
+    'admin_or_member': 'rule:context_is_admin or role:member',
+    'reader': 'rule:admin_or_member or role:reader',
+    'not_banned': 'not role:banned',
+    'get_objectspy': 'rule:reader and rule:not_banned',
+    'owner': 'tenant:%(owner)s',
+    'admin_or_owner': 'rule:context_is_admin or rule:owner',
+    'publicize_image': 'role:admin and not role:readonly',
+}
+
+CREDENTIALS = {
+    'admin': ['admin'],
+    'member': ['member', '_member_'],
+    'reader': ['reader'],
+    'anonymous': [],
+}
+
+
+def _decisions_per_second(decide, duration):
+    count = 0
+    start = now()
+    while True:
+        for _ in range(1000):
+            decide()
+        count += 1000
+        elapsed = now() - start
+        if elapsed >= duration:
+            return count / elapsed
+
+
+def _interpreted(enforcer, context, action, target):
+    credentials = {
+        'roles': context.roles,
+        'user': context.user,
+        'tenant': context.tenant,
+    }
+    return lambda: oslo_policy.Enforcer.enforce(enforcer, action, target,
+                                                credentials)
+
+
+def run(args):
+    if args.policy_file:
+        CONF.set_override('policy_file', os.path.abspath(args.policy_file),
+                          group='oslo_policy')
+    results = []
+    for mode, cache_size in (('interpreted', 0), ('compiled', 0),
+                             ('cached', 1024)):
+        CONF.set_override('policy_decision_cache_size', cache_size)
+        enforcer = policy.Enforcer()
+        if not args.policy_file:
+            enforcer.add_rules(oslo_policy.Rules.from_dict(SAMPLE_RULES))
+        rules = enforcer.compiled_rules().rules
+        for name in sorted(rules):
+            for credential, roles in sorted(CREDENTIALS.items()):
+                context = clictest.context.RequestContext(
+                    roles=roles, tenant='tenant', is_admin=True,
+                    policy_enforcer=enforcer)
+                target = {'owner': 'tenant'}
+                if mode == 'interpreted':
+                    decide = _interpreted(enforcer, context, name, target)
+                else:
+                    decide = (lambda context=context, name=name:
+                              enforcer.check(context, name, target))
+                results.append({
+                    'mode': mode,
+                    'rule': name,
+                    'credentials': credential,
+                    'decision': bool(decide()),
+                    'per_second': _decisions_per_second(decide,
+                                                        args.duration),
+                })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--policy-file',
+                        help='Policy file to benchmark instead of the '
+                             'sample rules.')
+    parser.add_argument('--duration', type=float, default=0.2,
+                        help='Seconds each decision is repeated for.')
+    parser.add_argument('--json', action='store_true',
+                        help='Write the results as JSON.')
+    args = parser.parse_args(argv)
+    CONF([], project='clictest')
+
+    results = run(args)
+    if args.json:
+        sys.stdout.write(json.dumps(results, indent=2, sort_keys=True) + '\n')
+        return
+
+    by_mode = {}
+    for result in results:
+        by_mode.setdefault(result['mode'], {})[
+            (result['rule'], result['credentials'])] = result
+    sys.stdout.write('%-18s %-10s %-6s %12s %12s %12s\n' % (
+        'rule', 'creds', 'result', 'interpreted', 'compiled', 'cached'))
+    for key in sorted(by_mode['interpreted']):
+        row = [by_mode[mode][key] for mode in ('interpreted', 'compiled',
+                                               'cached')]
+        decisions = set(result['decision'] for result in row)
+        if len(decisions) != 1:
+            sys.stderr.write('Decisions differ for %s %s\n' % key)
+        sys.stdout.write('%-18s %-10s %-6s %12.0f %12.0f %12.0f\n' % (
+            key[0], key[1], row[0]['decision'],
+            row[0]['per_second'], row[1]['per_second'],
+            row[2]['per_second']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,435 @@
+#!/usr/bin/env python
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of the clictest API request pipeline.
+
+For every paste pipeline flavor, clictest-api is started against a local
+fake ObjectSpyWeb service and every route is driven at each concurrency
+level for a fixed duration. Throughput, latency percentiles and the resident
+memory of every worker are reported as JSON, so that the results of two
+commits can be compared with compare.py.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import eventlet
+eventlet.monkey_patch(socket=True, time=True, select=True)
+
+from monotonic import monotonic as now  # noqa
+from six.moves import http_client  # noqa
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(os.path.dirname(TOOLS_DIR))
+
+ROUTES = {
+    'v1': '/v1/objectspy/bench/bench/chrome/example.org/1',
+    'v2': '/v2/objectspy',
+}
+
+# NOTE: The context middleware of the trusted-auth flavor builds the request
+# context from the headers normally set by keystonemiddleware.
+AUTH_HEADERS = {
+    'X-Identity-Status': 'Confirmed',
+    'X-User-Id': 'bench-user',
+    'X-Tenant-Id': 'bench-tenant',
+    'X-Roles': 'member',
+}
+
+PERCENTILES = (('p50', 50.0), ('p99', 99.0), ('p999', 99.9))
+
+
+def _free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def _wait_until(predicate, timeout, interval=0.1):
+    deadline = now() + timeout
+    while now() < deadline:
+        if predicate():
+            return True
+        time.sleep(interval)
+    return False
+
+
+def _terminate(proc, timeout=10):
+    if proc.poll() is not None:
+        return
+    proc.send_signal(signal.SIGTERM)
+    if not _wait_until(lambda: proc.poll() is not None, timeout):
+        proc.kill()
+        proc.wait()
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR,
+            stderr=open(os.devnull, 'w')).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def child_pids(pid):
+    """Return the pids of the children of a process, on Linux."""
+    children = []
+    try:
+        entries = os.listdir('/proc')
+    except OSError:
+        return children
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open('/proc/%s/stat' % entry) as f:
+                stat = f.read()
+        except (IOError, OSError):
+            continue
+        # NOTE: The command name may contain spaces, the fields after it
+        # are state and ppid.
+        fields = stat[stat.rfind(')') + 2:].split()
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def rss_kb(pid):
+    """Return the resident set size of a process in kB, on Linux."""
+    try:
+        with open('/proc/%d/status' % pid) as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except (IOError, OSError):
+        pass
+    return None
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an ordered list."""
+    if not ordered:
+        return None
+    rank = int(round(pct / 100.0 * len(ordered) + 0.5)) - 1
+    return ordered[max(0, min(rank, len(ordered) - 1))]
+
+
+class FakeUpstream(object):
+    """The fake ObjectSpyWeb service, run in its own process."""
+
+    def __init__(self, args):
+        self.args = args
+        self.proc = None
+        self.port = None
+
+    def start(self):
+        cmd = [sys.executable, os.path.join(TOOLS_DIR, 'fake_objectspy.py'),
+               '--latency', str(self.args.upstream_latency),
+               '--jitter', str(self.args.upstream_jitter),
+               '--payload', str(self.args.upstream_payload),
+               '--error-rate', str(self.args.upstream_error_rate)]
+        if self.args.seed is not None:
+            cmd.extend(['--seed', str(self.args.seed)])
+        self.proc = subprocess.Popen(cmd, stdout=subprocess.PIPE)
+        self.port = int(self.proc.stdout.readline())
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d/ObjectSpyWeb' % self.port
+
+    def stop(self):
+        if self.proc is not None:
+            _terminate(self.proc)
+
+
+class APIServer(object):
+    """A clictest-api process serving one paste pipeline flavor."""
+
+    def __init__(self, args, flavor, upstream_url, workdir):
+        self.args = args
+        self.flavor = flavor
+        self.upstream_url = upstream_url
+        self.workdir = workdir
+        self.port = _free_port()
+        self.proc = None
+
+    def _write_config(self):
+        name = self.flavor or 'default'
+        path = os.path.join(self.workdir, 'clictest-api-%s.conf' % name)
+        lines = [
+            '[DEFAULT]',
+            'bind_host = 127.0.0.1',
+            'bind_port = %d' % self.port,
+            'workers = %d' % self.args.workers,
+            'objectspy_url = %s' % self.upstream_url,
+            'log_file = %s' % os.path.join(self.workdir,
+                                           'clictest-api-%s.log' % name),
+            '[paste_deploy]',
+            'config_file = %s' % self.args.paste_config,
+        ]
+        if self.flavor:
+            lines.append('flavor = %s' % self.flavor)
+        for extra in self.args.config:
+            lines.extend(extra.split('\\n'))
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def _responding(self):
+        conn = http_client.HTTPConnection('127.0.0.1', self.port, timeout=1)
+        try:
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            return True
+        except (socket.error, http_client.HTTPException):
+            return False
+        finally:
+            conn.close()
+
+    def start(self):
+        cmd = self.args.api_command.split() + ['--config-file',
+                                               self._write_config()]
+        self.proc = subprocess.Popen(cmd, cwd=REPO_DIR)
+        started = _wait_until(
+            lambda: self.proc.poll() is not None or self._responding(),
+            self.args.startup_timeout)
+        if not started or self.proc.poll() is not None:
+            self.stop()
+            raise RuntimeError('clictest-api failed to start for flavor %r, '
+                               'see the logs in %s' %
+                               (self.flavor, self.workdir))
+        if self.args.workers:
+            _wait_until(lambda: len(self.workers()) >= self.args.workers,
+                        self.args.startup_timeout)
+
+    def workers(self):
+        if not self.args.workers:
+            return [self.proc.pid]
+        return child_pids(self.proc.pid)
+
+    def memory(self):
+        return dict((str(pid), rss_kb(pid)) for pid in self.workers())
+
+    def stop(self):
+        if self.proc is not None:
+            _terminate(self.proc)
+
+
+def _client(port, path, headers, deadline, latencies, statuses):
+    conn = http_client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while now() < deadline:
+        start = now()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (socket.error, http_client.HTTPException):
+            conn.close()
+            conn = http_client.HTTPConnection('127.0.0.1', port, timeout=60)
+            status = 0
+        latencies.append(now() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+    conn.close()
+
+
+def drive(port, path, headers, concurrency, duration):
+    """Keep `concurrency` connections busy with `path` for `duration`."""
+    latencies = []
+    statuses = {}
+    pool = eventlet.GreenPool(concurrency)
+    start = now()
+    deadline = start + duration
+    for _ in range(concurrency):
+        pool.spawn_n(_client, port, path, headers, deadline,
+                     latencies, statuses)
+    pool.waitall()
+    return latencies, statuses, now() - start
+
+
+def summarize(latencies, statuses, elapsed):
+    ordered = sorted(latencies)
+    errors = sum(count for status, count in statuses.items()
+                 if not 200 <= status < 400)
+    summary = {
+        'requests': len(ordered),
+        'errors': errors,
+        'statuses': dict((str(status), count)
+                         for status, count in statuses.items()),
+        'throughput': len(ordered) / elapsed if elapsed else 0.0,
+        'latency_ms': {},
+    }
+    for name, pct in PERCENTILES:
+        value = percentile(ordered, pct)
+        summary['latency_ms'][name] = (None if value is None
+                                       else round(value * 1000, 3))
+    if ordered:
+        summary['latency_ms']['mean'] = round(
+            sum(ordered) / len(ordered) * 1000, 3)
+        summary['latency_ms']['max'] = round(ordered[-1] * 1000, 3)
+    return summary
+
+
+def run(args):
+    headers = dict(AUTH_HEADERS)
+    for header in args.header:
+        name, _sep, value = header.partition(':')
+        headers[name.strip()] = value.strip()
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix='clictest-bench-')
+    upstream = FakeUpstream(args)
+    upstream.start()
+    try:
+        for flavor in args.flavor:
+            server = APIServer(args, flavor, upstream.url, workdir)
+            server.start()
+            try:
+                for route in args.route:
+                    path = ROUTES[route]
+                    for concurrency in args.concurrency:
+                        if args.warmup:
+                            drive(server.port, path, headers, concurrency,
+                                  args.warmup)
+                        summary = summarize(*drive(server.port, path,
+                                                   headers, concurrency,
+                                                   args.duration))
+                        summary.update({
+                            'flavor': flavor or 'default',
+                            'route': route,
+                            'concurrency': concurrency,
+                            'rss_kb': server.memory(),
+                        })
+                        results.append(summary)
+                        sys.stderr.write(
+                            '%(flavor)s %(route)s c=%(concurrency)d: '
+                            '%(throughput).1f req/s, p99 %(p99)s ms, '
+                            '%(errors)d errors\n' %
+                            dict(summary, p99=summary['latency_ms']['p99']))
+            finally:
+                server.stop()
+    finally:
+        upstream.stop()
+        if args.keep_logs:
+            sys.stderr.write('Logs kept in %s\n' % workdir)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'date': datetime.datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.sysconf('SC_NPROCESSORS_ONLN'),
+            'workers': args.workers,
+            'duration': args.duration,
+            'upstream': {
+                'latency_ms': args.upstream_latency,
+                'jitter_ms': args.upstream_jitter,
+                'payload': args.upstream_payload,
+                'error_rate': args.upstream_error_rate,
+            },
+        },
+        'results': results,
+    }
+
+
+def _list(convert):
+    def parse(value):
+        return [convert(item) for item in value.split(',')]
+    return parse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--flavor', type=_list(str),
+                        default=['', 'trusted-auth'],
+                        help='Comma separated paste pipeline flavors, an '
+                             'empty name is the default pipeline. The '
+                             'keystone flavor needs a reachable keystone and '
+                             'a token passed with --header.')
+    parser.add_argument('--route', type=_list(str), default=['v1', 'v2'],
+                        help='Comma separated routes among: %s.' %
+                             ', '.join(sorted(ROUTES)))
+    parser.add_argument('--concurrency', type=_list(int),
+                        default=[1, 8, 32],
+                        help='Comma separated concurrency levels.')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='Seconds each level is measured for.')
+    parser.add_argument('--warmup', type=float, default=2.0,
+                        help='Seconds each level runs for before being '
+                             'measured.')
+    parser.add_argument('--workers', type=int, default=2,
+                        help='Number of API workers, 0 runs a single '
+                             'process.')
+    parser.add_argument('--upstream-latency', type=float, default=5.0,
+                        help='Latency of the fake ObjectSpyWeb, in ms.')
+    parser.add_argument('--upstream-jitter', type=float, default=0.0,
+                        help='Random latency added on top, in ms.')
+    parser.add_argument('--upstream-payload', type=int, default=4096,
+                        help='Size of the ObjectSpyWeb responses, in bytes.')
+    parser.add_argument('--upstream-error-rate', type=float, default=0.0,
+                        help='Share of the ObjectSpyWeb calls failing.')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Seed of the fake ObjectSpyWeb randomness.')
+    parser.add_argument('--header', action='append', default=[],
+                        help='Extra "Name: value" request header.')
+    parser.add_argument('--config', action='append', default=[],
+                        help='Extra line, or \\n separated lines, appended '
+                             'verbatim to the generated API configuration '
+                             'file, e.g. "[DEFAULT]\\nworkers = 4".')
+    parser.add_argument('--paste-config',
+                        default=os.path.join(REPO_DIR, 'etc',
+                                             'clictest-api-paste.ini'))
+    parser.add_argument('--api-command',
+                        default='%s -m clictest.cmd.api' % sys.executable,
+                        help='Command starting the API, it is given the '
+                             'generated --config-file.')
+    parser.add_argument('--startup-timeout', type=float, default=30.0)
+    parser.add_argument('--keep-logs', action='store_true')
+    parser.add_argument('--output', help='File the JSON report is written '
+                                         'to, instead of stdout.')
+    args = parser.parse_args(argv)
+
+    unknown = set(args.route) - set(ROUTES)
+    if unknown:
+        parser.error('unknown routes: %s' % ', '.join(sorted(unknown)))
+
+    report = json.dumps(run(args), indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    else:
+        sys.stdout.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+# Copyright 2016 OpenStack Foundation
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""
+Benchmark of the chunked uploads of BaseClient.
+
+A stream read from /dev/zero is uploaded with the chunked transfer encoding
+to a local server which discards it, by reading it through a file-like body,
+by iterating over a body, and with the framing of every chunk concatenated
+to it as BaseClient used to do. The throughput of every mode is reported.
+"""
+
+import argparse
+import io
+import json
+import os
+import socket
+import sys
+import threading
+
+from monotonic import monotonic as now
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)))))
+
+from clictest.common import client  # noqa
+
+MIB = 1024 * 1024
+
+
+class ZeroReader(object):
+    """Non-seekable file-like object reading `size` bytes of /dev/zero."""
+
+    def __init__(self, size):
+        self.left = size
+        self._fp = io.FileIO('/dev/zero')
+
+    def readinto(self, buf):
+        size = self._fp.readinto(memoryview(buf)[:min(len(buf), self.left)])
+        self.left -= size
+        return size
+
+    def read(self, size=-1):
+        if size < 0 or size > self.left:
+            size = self.left
+        data = self._fp.read(size)
+        self.left -= len(data)
+        return data
+
+
+def _zero_chunks(size):
+    reader = ZeroReader(size)
+    while True:
+        chunk = reader.read(client.CHUNKSIZE)
+        if not chunk:
+            break
+        yield chunk
+
+
+class JoinedClient(client.BaseClient):
+    """BaseClient concatenating every chunk to its framing."""
+
+    def _send_chunked(self, connection, body):
+        connection.putheader('Transfer-Encoding', 'chunked')
+        connection.endheaders()
+        for chunk in client.utils.chunkreadable(body):
+            connection.send(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+        connection.send(b'0\r\n\r\n')
+
+
+class DiscardingServer(threading.Thread):
+    """HTTP server reading chunked requests and discarding their body."""
+
+    def __init__(self):
+        super(DiscardingServer, self).__init__()
+        self.daemon = True
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen(8)
+        self.port = self.sock.getsockname()[1]
+
+    def run(self):
+        while True:
+            conn = self.sock.accept()[0]
+            threading.Thread(target=self._serve, args=(conn,)).start()
+
+    def _serve(self, conn):
+        # NOTE: Only the last chunk is a line holding a single 0.
+        view = memoryview(bytearray(4 * MIB))
+        tail = b''
+        while True:
+            size = conn.recv_into(view)
+            if not size:
+                break
+            tail = (tail + bytes(view[max(0, size - 7):size]))[-7:]
+            if tail == b'\r\n0\r\n\r\n':
+                conn.sendall(b'HTTP/1.1 201 Created\r\n'
+                             b'Content-Length: 0\r\n\r\n')
+                tail = b''
+        conn.close()
+
+
+def run(args):
+    server = DiscardingServer()
+    server.start()
+    size = args.size * MIB
+    modes = [
+        ('joined', JoinedClient, ZeroReader),
+        ('readinto', client.BaseClient, ZeroReader),
+        ('iterable', client.BaseClient, _zero_chunks),
+    ]
+    results = []
+    for mode, client_class, source in modes:
+        c = client_class('127.0.0.1', server.port, auth_token='benchmark')
+        start = now()
+        c.do_request('PUT', '/upload', source(size)).read()
+        elapsed = now() - start
+        results.append({'mode': mode, 'bytes': size, 'seconds': elapsed,
+                        'mib_per_second': args.size / elapsed})
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument('--size', type=int, default=2048,
+                        help='MiB uploaded in every mode.')
+    parser.add_argument('--json', action='store_true',
+                        help='Write the results as JSON.')
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    if args.json:
+        sys.stdout.write(json.dumps(results, indent=2, sort_keys=True) + '\n')
+        return
+
+    sys.stdout.write('%-10s %12s %10s %10s\n' % ('mode', 'MiB', 'seconds',
+                                                 'MiB/s'))
+    for result in results:
+        sys.stdout.write('%-10s %12d %10.2f %10.1f\n' % (
+            result['mode'], result['bytes'] // MIB, result['seconds'],
+            result['mib_per_second']))
+
+
+if __name__ == '__main__':
+    main()